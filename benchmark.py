@@ -0,0 +1,224 @@
+import os
+import sys
+import json
+import time
+import shutil
+import zlib
+import argparse
+import tempfile
+import threading
+import datetime
+from collections import defaultdict
+
+import numpy as np
+import requests
+
+from edcompanion.synthetic import event_mixes, write_synthetic_journals
+
+repo_path = os.path.dirname(os.path.abspath(__file__))
+
+def peak_rss_mb():
+    '''Peak resident set size of this process in MB, None when unknown'''
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on linux, bytes on macos
+        return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+    except ImportError:
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+    except (ImportError, AttributeError):
+        return None
+
+def stub_network(delay=0.0):
+    '''Replaces requests.get and requests.post with local answers for
+    EDSM and EDAstro, each call takes delay seconds'''
+
+    class StubResponse:
+        status_code = 200
+        def __init__(self, data):
+            self.data = data
+        def json(self):
+            return self.data
+
+    def get(url, params=None, **kwargs):
+        time.sleep(delay)
+        params = params or {}
+        if 'edastro' in url:
+            return StubResponse([])
+        if 'systemName' in params and 'system' in url:
+            h = zlib.crc32(params['systemName'].encode()) % 1000
+            return StubResponse(dict(name=params['systemName'], coords=dict(x=h, y=h / 2, z=h / 3)))
+        if 'traffic' in url:
+            return StubResponse(dict(traffic=dict(week=0)))
+        if 'cube' in url or 'sphere' in url:
+            return StubResponse([])
+        return StubResponse({})
+
+    def post(url, *args, **kwargs):
+        time.sleep(delay)
+        return StubResponse(dict(msg='OK'))
+
+    requests.get = get
+    requests.post = post
+
+def create_journal_writer(journals, livepath, speed=60.0):
+    """Copies journals into livepath line by line, pacing the events by their
+    timestamps at speed times real time, as fast as possible when speed is 0.
+    Ends with a KeyboardInterrupt event and an empty newer journal, which
+    stops follow_journal.
+
+    follow_journal starts at the newest journal, so after the first event
+    the writer waits for following to begin, see started().
+
+    returns an object with the following members:
+        written list of perf_counter times at which each event was written
+        started() tells the writer the first event arrived
+        start(), join()"""
+
+    class writerfactory(dict):
+        def __getattr__(self, key):
+            return self[key]
+
+    written = []
+    following = threading.Event()
+
+    def run():
+        started = time.perf_counter()
+        first_time = None
+        for journal in journals:
+            livefile = os.path.join(livepath, os.path.basename(journal))
+            with open(journal, 'rt') as source, open(livefile, 'at') as target:
+                for line in source:
+                    if speed:
+                        event_time = datetime.datetime.strptime(json.loads(line)['timestamp'], '%Y-%m-%dT%H:%M:%SZ').timestamp()
+                        first_time = first_time if first_time is not None else event_time
+                        wait = started + (event_time - first_time) / speed - time.perf_counter()
+                        if wait > 0:
+                            time.sleep(wait)
+                    written.append(time.perf_counter())
+                    target.write(line)
+                    target.flush()
+                    if len(written) == 1:
+                        following.wait()
+            # sessions follow each other without waiting for the gap between them
+            first_time = None
+            started = time.perf_counter()
+
+        # journal names sort by their time, the empty one comes after the last session
+        ended = datetime.datetime.strptime(json.loads(line)['timestamp'], '%Y-%m-%dT%H:%M:%SZ') + datetime.timedelta(hours=1)
+        with open(livefile, 'at') as target:
+            target.write(json.dumps(dict(timestamp=ended.strftime('%Y-%m-%dT%H:%M:%SZ'), event='KeyboardInterrupt', filename=os.path.basename(livefile))) + '\n')
+        open(os.path.join(livepath, f"Journal.{ended.strftime('%Y-%m-%dT%H%M%S')}.01.log"), 'wt').close()
+
+    thread = threading.Thread(target=run, name='journal-writer', daemon=True)
+
+    return writerfactory(
+        written=written,
+        started=following.set,
+        start=thread.start,
+        join=thread.join)
+
+def percentiles(values, qs=(50, 90, 99, 100)):
+    return {f"p{q}": round(float(np.percentile(values, q)), 3) for q in qs} if len(values) else {}
+
+def run_benchmark(mix='exploration', journals=2, events=2000, speed=0.0, seed=7, workdir=None,
+                  edsm_delay=0.0, deadline=None, display='quiet'):
+    '''Generates synthetic journals and replays them through follow_journal,
+    returns a dict with throughput, latency percentiles in ms and peak RSS'''
+    workdir = workdir or tempfile.mkdtemp(prefix='edc-benchmark-')
+    sourcepath = os.path.join(workdir, 'source')
+    livepath = os.path.join(workdir, 'live')
+    # journals left from an earlier run in workdir would be newer than the first one
+    shutil.rmtree(livepath, ignore_errors=True)
+    if os.path.exists(os.path.join(workdir, 'follow_checkpoint.json')):
+        os.remove(os.path.join(workdir, 'follow_checkpoint.json'))
+    for path in [sourcepath, livepath, os.path.join(workdir, 'logs'), os.path.join(workdir, 'data', 'guardian')]:
+        os.makedirs(path, exist_ok=True)
+
+    filenames = write_synthetic_journals(sourcepath, journals, events, mix, seed)
+    shutil.copy(os.path.join(sourcepath, 'NavRoute.json'), livepath)
+    glines = os.path.join(repo_path, 'data', 'guardian', 'glines.json')
+    if os.path.exists(glines):
+        shutil.copy(glines, os.path.join(workdir, 'data', 'guardian'))
+
+    stub_network(edsm_delay)
+    # follow_log keeps its files in the current directory
+    os.chdir(workdir)
+    sys.path.insert(0, repo_path)
+    import follow_log
+    follow_log.edlogspath = livepath
+    # without the pause post_journal_item keeps between sends
+    follow_log.post_journal_item = lambda journal_item, **kwargs: time.sleep(edsm_delay) or dict(msg='OK')
+
+    writer = create_journal_writer(filenames, livepath, speed)
+    latencies = []
+    latency_by_event = defaultdict(list)
+    handled = dict(last=None)
+
+    def measure(eventname, event, timestamp, header):
+        if eventname in ('JournalFinished', 'KeyboardInterrupt'):
+            return None
+        latency = 1000 * (time.perf_counter() - writer.written[len(latencies)])
+        if not latencies:
+            writer.started()
+        latencies.append(latency)
+        latency_by_event[eventname].append(latency)
+        handled['last'] = time.perf_counter()
+        return None
+
+    # the first journal has to be the newest when following starts
+    open(os.path.join(livepath, os.path.basename(filenames[0])), 'wt').close()
+    writer.start()
+    started = time.perf_counter()
+    follow_log.follow_journal(backlog=0, verbose=False, resume=False, handlers={'*':measure},
+                              deadline=deadline, display=display)
+    stopped = time.perf_counter()
+    writer.join()
+    elapsed = (handled['last'] or stopped) - writer.written[0] if writer.written else 0
+
+    slowest = sorted(latency_by_event.items(), key=lambda item: -np.percentile(item[1], 99))[:8]
+    return dict(
+        mix=mix,
+        speed=speed,
+        events=len(latencies),
+        seconds=round(elapsed, 3),
+        total_seconds=round(stopped - started, 3),
+        events_per_second=round(len(latencies) / elapsed, 1) if elapsed else None,
+        latency_ms=percentiles(latencies),
+        slowest_events={name: percentiles(values, (50, 99)) for name, values in slowest},
+        peak_rss_mb=round(peak_rss_mb(), 1) if peak_rss_mb() is not None else None,
+        workdir=workdir)
+
+def print_report(result):
+    print(f"\nMix {result['mix']}, speed {result['speed'] or 'unthrottled'}")
+    print(f"{result['events']} events in {result['seconds']} s, {result['events_per_second']} events/s, {result['total_seconds']} s including startup and shutdown")
+    print(f"Latency ms: {', '.join(f'{k} {v}' for k, v in result['latency_ms'].items())}")
+    for name, values in result['slowest_events'].items():
+        print(f"    {name:24} {', '.join(f'{k} {v}' for k, v in values.items())}")
+    print(f"Peak RSS {result['peak_rss_mb']} MB")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Replays synthetic journals through follow_journal')
+    parser.add_argument('--mix', choices=list(event_mixes), default='exploration')
+    parser.add_argument('--journals', type=int, default=2)
+    parser.add_argument('--events', type=int, default=2000, help='events per journal')
+    parser.add_argument('--speed', type=float, default=0.0, help='times real time, 0 is as fast as possible')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--edsm-delay', type=float, default=0.0, help='seconds per stubbed EDSM call')
+    parser.add_argument('--deadline', type=float, default=None)
+    parser.add_argument('--display', choices=['quiet', 'console'], default='quiet')
+    parser.add_argument('--workdir', default=None)
+    parser.add_argument('--json', default=None, help='also write the result to this file')
+    args = parser.parse_args()
+
+    result = run_benchmark(
+        mix=args.mix, journals=args.journals, events=args.events, speed=args.speed, seed=args.seed,
+        workdir=args.workdir and os.path.abspath(args.workdir), edsm_delay=args.edsm_delay,
+        deadline=args.deadline, display=args.display)
+    print_report(result)
+    if args.json:
+        with open(os.path.join(repo_path, args.json) if not os.path.isabs(args.json) else args.json, 'wt') as jsonfile:
+            json.dump(result, jsonfile, indent=3)
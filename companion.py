@@ -1,28 +1,43 @@
 
-import curses
-from curses import wrapper
-from edcompanion.events import edc_track_journal
-
+import sys
 import logging
 
-logging.basicConfig(
-    format="%(asctime)s.%(msecs)03d \t%(threadName)s\t%(name)s\t%(lineno)d\t%(levelname)s\t%(message)s",
-    datefmt="%Y-%m-%dT%H:%M:%S",
-    level=logging.INFO
-)
+from cursedlog import CursesHandler
+from edcompanion.dashboard import create_dashboard
+
+import follow_log
+
+def main(backlog=0, verbose=True):
+    '''Follows the journals on the curses dashboard, replaying a backlog
+    runs without output'''
+    if backlog:
+        return follow_log.follow_journal(backlog=backlog, verbose=verbose, display='quiet')
 
-logging.captureWarnings(True)
+    dashboard = create_dashboard()
 
-def main(stdscr):
-    syslog = logging.getLogger(f"root.{__name__}")
-    stdscr.clear()
-    for i in range(0,11):
-        v = i-10
-        print(f"10 divide by {v} is {10/v:2}")
+    # log records go to the dashboard instead of the console
+    logger = logging.getLogger()
+    console_handlers = [h for h in logger.handlers if type(h) is logging.StreamHandler]
+    for handler in console_handlers:
+        logger.removeHandler(handler)
+    curses_handler = CursesHandler(dashboard)
+    curses_handler.setLevel(logging.WARNING)
+    curses_handler.setFormatter(logging.Formatter("%(levelname)s %(name)s %(message)s"))
+    logger.addHandler(curses_handler)
 
-    stdscr.refresh()
-    stdscr.getkey()
-    return
+    dashboard.start()
+    try:
+        return follow_log.follow_journal(backlog=0, verbose=verbose, display=dashboard)
+    finally:
+        dashboard.stop()
+        dashboard.join()
+        logger.removeHandler(curses_handler)
+        for handler in console_handlers:
+            logger.addHandler(handler)
 
 if __name__ == "__main__":
-    wrapper(main)
\ No newline at end of file
+    try:
+        main(backlog=int(sys.argv[1]) if len(sys.argv) > 1 else 0)
+    except KeyboardInterrupt:
+        pass
+    print(f"\nDone")
@@ -42,6 +42,45 @@ def line_from_points(points):
         support = support,
     )
 
+NT_LineDistances = namedtuple('line_distances', ['names', 'distances', 'projections', 'nearest'])
+
+def line_arrays(lines):
+    """Stacks a dict of lines, NT_Line or dicts with direction and support,
+    into names, directions (L,3) and supports (L,3)"""
+    names = list(lines)
+    as_dicts = [l._asdict() if hasattr(l, '_asdict') else l for l in lines.values()]
+    directions = np.asarray([d['direction'] for d in as_dicts], dtype=float).reshape(-1, 3)
+    supports = np.asarray([d['support'] for d in as_dicts], dtype=float).reshape(-1, 3)
+    return names, directions, supports
+
+def distances_to_lines(points, directions, supports):
+    """Distances (N,L) between each of the points (N,3) and each line"""
+    offsets = np.asarray(points, dtype=float).reshape(-1, 1, 3) - supports[np.newaxis, :, :]
+    return np.linalg.norm(
+        np.cross(directions[np.newaxis, :, :], offsets, axis=-1),
+        axis=-1) / np.linalg.norm(directions, axis=-1)
+
+def project_points_on_lines(points, directions, supports):
+    """Projections (N,L,3) of each of the points (N,3) on each line"""
+    units = directions / np.linalg.norm(directions, axis=-1)[:, np.newaxis]
+    offsets = np.asarray(points, dtype=float).reshape(-1, 1, 3) - supports[np.newaxis, :, :]
+    t = np.sum(offsets * units[np.newaxis, :, :], axis=-1)
+    return t[:, :, np.newaxis] * units[np.newaxis, :, :] + supports[np.newaxis, :, :]
+
+def points_to_lines(points, lines):
+    """Distances and projections of points (N,3) on a dict of lines
+
+    returns named tuple with the line names, distances (N,L), projections
+    (N,L,3) and the index of the nearest line for each point (N,)"""
+    names, directions, supports = line_arrays(lines)
+    distances = distances_to_lines(points, directions, supports)
+    return NT_LineDistances(
+        names = names,
+        distances = distances,
+        projections = project_points_on_lines(points, directions, supports),
+        nearest = np.argmin(distances, axis=1) if len(names) else np.zeros(len(distances), dtype=int),
+    )
+
 def create_get_bits_func(bits, offset):
     mask=(2**bits)-1
     shift_right = (64 - offset) - bits
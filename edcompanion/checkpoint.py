@@ -0,0 +1,53 @@
+#pylint: disable=missing-module-docstring
+#pylint: disable=missing-function-docstring
+#pylint: disable=invalid-name
+
+import json
+import time
+import logging
+
+from edcompanion.persistence import write_json_file
+
+syslog = logging.getLogger(f"root.{__name__}")
+
+def load_checkpoint(filename='follow_checkpoint.json'):
+    '''Returns the saved cursor and state, or empty dicts'''
+    try:
+        with open(filename, 'rt') as jsonfile:
+            checkpoint = json.load(jsonfile)
+        return checkpoint.get('cursor', {}), checkpoint.get('state', {})
+    except FileNotFoundError:
+        pass
+    except Exception as x:
+        syslog.error(f"Ignoring checkpoint {filename}: {x}")
+
+    return {}, {}
+
+def save_checkpoint(cursor, state, filename='follow_checkpoint.json'):
+    '''Writes cursor and state next to filename, then renames it into place'''
+    try:
+        write_json_file(filename, json.dumps(dict(cursor=cursor, state=state, saved=time.time())))
+    except Exception as x:
+        syslog.exception('Error %s', str(x))
+
+def create_checkpointer(snapshot, filename='follow_checkpoint.json', interval=30, writer=None):
+    '''Calls snapshot() and saves it with the cursor at most every interval seconds,
+    handing it to writer, a document writer from edcompanion.persistence, when given.
+    The snapshot is serialized right away, so the saved state matches the cursor
+    whenever the writer gets to it.
+
+    returns a function maybe_save(cursor, force=False)'''
+
+    last_saved = time.monotonic()
+
+    def maybe_save(cursor, force=False):
+        nonlocal last_saved
+        now = time.monotonic()
+        if force or now - last_saved > interval:
+            if writer is None:
+                save_checkpoint(cursor, snapshot(), filename)
+            else:
+                writer.put(filename, json.dumps(dict(cursor=cursor, state=snapshot(), saved=time.time())))
+            last_saved = now
+
+    return maybe_save
@@ -0,0 +1,207 @@
+#pylint: disable=missing-module-docstring
+#pylint: disable=missing-function-docstring
+#pylint: disable=invalid-name
+
+import sys
+import time
+import threading
+import logging
+from collections import deque
+
+try:
+    import curses
+except ImportError:
+    curses = None
+
+syslog = logging.getLogger(f"root.{__name__}")
+
+# Panes on the dashboard, top row first, the journal output fills the rest
+dashboard_layout = [['system', 'fuel', 'route'], ['missions', 'alerts']]
+
+def create_console(stream=None):
+    """Creates a display writing journal output to stream, sys.stdout when
+    not given, panes and alerts are ignored as the output already shows them
+
+    returns an object with the following members:
+        write(text) writes text
+        show(pane, source, lock=None) ignored
+        alert(text) ignored
+        start(), stop(), join()"""
+
+    class displayfactory(dict):
+        def __getattr__(self, key):
+            return self[key]
+
+    def write(text):
+        (stream or sys.stdout).write(text)
+
+    return displayfactory(
+        write=write,
+        show=lambda pane, source, lock=None: None,
+        alert=lambda text: None,
+        start=lambda: None,
+        stop=lambda: None,
+        join=lambda: None)
+
+def create_quiet_display():
+    """Creates a display that skips all output, for replaying journals"""
+    display = create_console()
+    display['write'] = lambda text: None
+    return display
+
+def create_dashboard(fps=4, scrollback=500, alerts=20, layout=None):
+    """Creates a curses dashboard with panes for the current state, the
+    journal output and alerts, redrawn by a background thread at most fps
+    times per second. Writes only update the text kept for the panes, so
+    any number of events between two frames cost a single redraw.
+
+    Pane sources are called on the drawing thread, holding lock when given,
+    and return the lines for the pane.
+
+    returns an object with the following members:
+        write(text) adds journal output, handles carriage returns the way
+            the console does so the header line is replaced in place
+        show(pane, source, lock=None) sets the source of a pane
+        alert(text) adds a line to the alerts pane
+        addstr(text), refresh() for cursedlog.CursesHandler, log records
+            are added to the journal output above the current line
+        start(), stop(), join()"""
+
+    class dashboardfactory(dict):
+        def __getattr__(self, key):
+            return self[key]
+
+    if curses is None:
+        raise ImportError("curses is not available, use the console display")
+
+    layout = layout or dashboard_layout
+    lock = threading.Lock()
+    lines = deque(maxlen=scrollback)
+    alert_lines = deque(maxlen=alerts)
+    sources = {}
+    state = dict(current='', dirty=True, thread=None)
+    stopping = threading.Event()
+
+    def write(text):
+        with lock:
+            parts = text.split('\n')
+            for i, part in enumerate(parts):
+                if '\r' in part:
+                    state['current'] = part.rsplit('\r', 1)[1]
+                else:
+                    state['current'] += part
+                if i < len(parts) - 1:
+                    lines.append(state['current'])
+                    state['current'] = ''
+            state['dirty'] = True
+
+    def addstr(text):
+        # log records go above the line being written
+        with lock:
+            lines.extend(text.strip('\n').split('\n'))
+            state['dirty'] = True
+
+    def alert(text):
+        with lock:
+            alert_lines.append(f"{time.strftime('%H:%M:%S')} {text}")
+            state['dirty'] = True
+
+    def show(pane, source, lock=None):
+        sources[pane] = (source, lock)
+        state['dirty'] = True
+
+    def refresh():
+        state['dirty'] = True
+
+    def _pane_lines(pane):
+        if pane == 'alerts':
+            with lock:
+                return list(alert_lines)
+        source, source_lock = sources.get(pane, (None, None))
+        if source is None:
+            return []
+        try:
+            if source_lock is None:
+                return [str(line) for line in source()]
+            with source_lock:
+                return [str(line) for line in source()]
+        except Exception as x:
+            return [f"Error {x}"]
+
+    def _put(screen, y, x, text, width, attr=0):
+        try:
+            screen.addnstr(y, x, text, width, attr)
+        except curses.error:
+            # writing the bottom right corner raises after drawing
+            pass
+
+    def _draw_pane(screen, top, left, height, width, title, content):
+        if height < 2 or width < 4:
+            return
+        _put(screen, top, left, f" {title} ".center(width - 1, '-'), width - 1, curses.A_BOLD)
+        for row, line in enumerate(content[-(height - 1):]):
+            _put(screen, top + 1 + row, left, line, width - 1)
+
+    def _draw(screen):
+        rows, cols = screen.getmaxyx()
+        screen.erase()
+        pane_height = max(3, rows // 6)
+        top = 0
+        for panes in layout:
+            width = cols // len(panes)
+            for n, pane in enumerate(panes):
+                _draw_pane(screen, top, n * width, pane_height, width, pane, _pane_lines(pane))
+            top += pane_height
+
+        with lock:
+            journal = list(lines) + [state['current']]
+        _draw_pane(screen, top, 0, rows - top, cols, 'journal', journal)
+        screen.noutrefresh()
+        curses.doupdate()
+
+    def run():
+        screen = curses.initscr()
+        try:
+            curses.noecho()
+            curses.cbreak()
+            curses.curs_set(0)
+            screen.nodelay(True)
+            screen.keypad(True)
+            while not stopping.wait(1 / fps):
+                # lets curses pick up a resized terminal
+                resized = screen.getch() == curses.KEY_RESIZE
+                if state['dirty'] or resized:
+                    state['dirty'] = False
+                    _draw(screen)
+            _draw(screen)
+        except Exception as x:
+            syslog.exception('Error %s', str(x))
+        finally:
+            screen.keypad(False)
+            curses.nocbreak()
+            curses.echo()
+            curses.endwin()
+
+    def start():
+        if state['thread'] is None:
+            stopping.clear()
+            state['thread'] = threading.Thread(target=run, name='dashboard', daemon=True)
+            state['thread'].start()
+
+    def stop():
+        stopping.set()
+
+    def join():
+        if state['thread'] is not None:
+            state['thread'].join()
+            state['thread'] = None
+
+    return dashboardfactory(
+        write=write,
+        show=show,
+        alert=alert,
+        addstr=addstr,
+        refresh=refresh,
+        start=start,
+        stop=stop,
+        join=join)
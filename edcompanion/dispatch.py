@@ -0,0 +1,88 @@
+#pylint: disable=missing-module-docstring
+#pylint: disable=missing-function-docstring
+#pylint: disable=invalid-name
+
+import time
+import logging
+
+syslog = logging.getLogger(f"root.{__name__}")
+
+# Handler results, the strongest result of all handlers for an event wins
+DONE = 1    # event fully handled, skip whatever follows dispatch
+STOP = 2    # stop reading the current journal
+
+def create_event_dispatcher(name='events'):
+    """Creates a registry mapping event names to handler callables
+
+    returns an object with the following members:
+        register(*eventnames) decorator adding a handler for exact names
+        register_match(predicate) decorator adding a handler for every
+            event name for which predicate(eventname) is true
+        dispatch(eventname, *args) calls handler(eventname, *args) for
+            each handler of eventname, returns the strongest result
+        stats() dict of handler name -> (calls, seconds)
+        report() stats as text, slowest handlers first"""
+
+    class dispatcherfactory(dict):
+        def __getattr__(self, key):
+            return self[key]
+
+    exact = {}
+    matchers = []
+    resolved = {}
+    timings = {}
+
+    def register(*eventnames):
+        def decorator(handler):
+            for eventname in eventnames:
+                exact.setdefault(eventname, []).append(handler)
+            timings.setdefault(handler.__name__, [0, 0])
+            resolved.clear()
+            return handler
+        return decorator
+
+    def register_match(predicate):
+        def decorator(handler):
+            matchers.append((predicate, handler))
+            timings.setdefault(handler.__name__, [0, 0])
+            resolved.clear()
+            return handler
+        return decorator
+
+    def handlers_for(eventname):
+        handlers = resolved.get(eventname)
+        if handlers is None:
+            handlers = tuple(
+                (handler, timings[handler.__name__])
+                for handler in exact.get(eventname, []) + [h for p, h in matchers if p(eventname)])
+            resolved[eventname] = handlers
+        return handlers
+
+    def dispatch(eventname, *args):
+        result = None
+        for handler, timing in handlers_for(eventname):
+            start = time.perf_counter_ns()
+            handled = handler(eventname, *args)
+            timing[1] += time.perf_counter_ns() - start
+            timing[0] += 1
+            if handled and (result is None or handled > result):
+                result = handled
+        return result
+
+    def stats():
+        return {h: (calls, ns / 1e9) for h, (calls, ns) in timings.items()}
+
+    def report():
+        lines = [f"{name} handler timings:"]
+        for h, (calls, seconds) in sorted(stats().items(), key=lambda s: -s[1][1]):
+            if calls:
+                lines.append(f"{h:28} {calls:9} calls {seconds:9.3f} s {1e6*seconds/calls:9.1f} us/call")
+        return '\n'.join(lines)
+
+    return dispatcherfactory(
+        register=register,
+        register_match=register_match,
+        dispatch=dispatch,
+        handlers_for=handlers_for,
+        stats=stats,
+        report=report)
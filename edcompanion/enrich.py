@@ -0,0 +1,133 @@
+#pylint: disable=missing-module-docstring
+#pylint: disable=missing-function-docstring
+#pylint: disable=invalid-name
+
+import asyncio
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+syslog = logging.getLogger(f"root.{__name__}")
+
+def create_enricher(deadline=None, timeout=30.0, workers=8):
+    """Creates a runner for network lookups that enrich journal events
+
+    Without a deadline lookups are called directly and on_result is called
+    right after. With a deadline lookups run concurrently on an asyncio
+    loop in a background thread, the caller waits at most deadline seconds
+    and a result arriving later is passed to on_result from another
+    thread, holding lock. Lookups taking longer than timeout are dropped.
+
+    returns an object with the following members:
+        enrich(on_result, func, *args) runs func(*args) and calls
+            on_result(result, late), returns what on_result returned when
+            the result was in time
+        lock the lock held around late results and by locked(), hold it
+            while changing or reading state the results use
+        locked(iterable) iterates holding lock, except while waiting for
+            the next item, also without a deadline so other threads
+            holding lock see the state between two items
+        stats() dict of counts of timely, late, expired and failed lookups
+        close()"""
+
+    class enricherfactory(dict):
+        def __getattr__(self, key):
+            return self[key]
+
+    lock = threading.RLock()
+    counts = dict(timely=0, late=0, expired=0, failed=0)
+    counts_lock = threading.Lock()
+
+    def count(key):
+        # late results are counted on the executor threads
+        with counts_lock:
+            counts[key] += 1
+
+    def stats():
+        with counts_lock:
+            return dict(counts)
+
+    def locked(iterable):
+        lock.acquire()
+        try:
+            iterator = iter(iterable)
+            while True:
+                lock.release()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    lock.acquire()
+                yield item
+        finally:
+            lock.release()
+
+    if deadline is None:
+        def enrich(on_result, func, *args):
+            count('timely')
+            return on_result(func(*args), False)
+
+        return enricherfactory(
+            enrich=enrich,
+            lock=lock,
+            locked=locked,
+            stats=stats,
+            close=lambda: None)
+
+    loop = asyncio.new_event_loop()
+    executor = ThreadPoolExecutor(workers, thread_name_prefix='enrich')
+    loop.set_default_executor(executor)
+    loop_thread = threading.Thread(target=loop.run_forever, daemon=True)
+    loop_thread.start()
+
+    async def lookup(func, args):
+        return await asyncio.wait_for(loop.run_in_executor(None, func, *args), timeout)
+
+    def deliver_late(on_result, future):
+        try:
+            result = future.result()
+        except (asyncio.TimeoutError, FutureTimeout):
+            count('expired')
+            return
+        except Exception as x:
+            count('failed')
+            syslog.error(f"Lookup failed: {x}")
+            return
+
+        count('late')
+        with lock:
+            try:
+                on_result(result, True)
+            except Exception as x:
+                syslog.exception('Error %s', str(x))
+
+    def enrich(on_result, func, *args):
+        future = asyncio.run_coroutine_threadsafe(lookup(func, args), loop)
+        try:
+            result = future.result(deadline)
+        except (asyncio.TimeoutError, FutureTimeout):
+            if future.done():
+                count('expired')
+            else:
+                future.add_done_callback(
+                    lambda f: executor.submit(deliver_late, on_result, f))
+            return None
+        except Exception as x:
+            count('failed')
+            syslog.error(f"Lookup failed: {x}")
+            return None
+
+        count('timely')
+        return on_result(result, False)
+
+    def close():
+        loop.call_soon_threadsafe(loop.stop)
+        executor.shutdown(wait=False)
+
+    return enricherfactory(
+        enrich=enrich,
+        lock=lock,
+        locked=locked,
+        stats=stats,
+        close=close)
@@ -3,26 +3,87 @@
 #pylint: disable=invalid-name
 
 import os
+import re
 import time
 import glob
 import json
 import logging
 import datetime
 import ntpath
+import mmap
+import select
+import ctypes
+import ctypes.util
 from functools import reduce
+from collections import namedtuple
+
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
 
 syslog = logging.getLogger(f"root.{__name__}")
 
 def loads_jsonline(line):
     return json.loads(line[0:-2]) if line[-2] == "," else json.loads(line)
 
+# Decoding ===========================================
+
+_event_name_str = re.compile(r'"event":\s*"([^"]*)"')
+_event_name_bytes = re.compile(rb'"event":\s*"([^"]*)"')
+
+def peek_event_name(line):
+    '''Event name from a raw journal line without decoding it'''
+    if isinstance(line, bytes):
+        match = _event_name_bytes.search(line)
+        return match.group(1).decode() if match else None
+    match = _event_name_str.search(line)
+    return match.group(1) if match else None
+
+def create_line_decoder(decode=json.loads, events=None, skip=None, fields=None):
+    '''Builds the per line decoder for the journal readers.
+
+    events: only these event names are decoded, None for all
+    skip: event names that are never decoded
+    fields: yield namedtuples with just these fields instead of dicts
+
+    returns decode_line(line) and accept(event), both give None for
+    events that are filtered out'''
+
+    events = frozenset(events) if events is not None else None
+    skip = frozenset(skip) if skip else None
+    record = namedtuple('JournalFields', fields, rename=True) if fields else None
+
+    def wanted(name):
+        return (events is None or name in events) and not (skip and name in skip)
+
+    def project(event):
+        return record._make([event.get(f) for f in fields]) if record else event
+
+    def accept(event):
+        return project(event) if wanted(event.get('event')) else None
+
+    if events is None and skip is None and record is None:
+        return decode, accept
+
+    def decode_line(line):
+        if (events is not None or skip) and not wanted(peek_event_name(line)):
+            return None
+        return project(decode(line))
+
+    return decode_line, accept
+
+def _is_shutdown(line):
+    return 'Shutdown' in line and peek_event_name(line) == 'Shutdown'
+
 def edc_list_journals(journalpath):
     return sorted(
             [os.path.join(journalpath, f) for f in os.listdir(journalpath) if 'Journal' in f.split('.')[0] and '.log' in f],
             key=lambda f:f.replace('-', '').replace('Journal.20', 'Journal.').replace('T','')
         )
 
-def edc_track_journal(journalpath, backlog=0):
+def edc_track_journal(journalpath, backlog=0, **read_kwargs):
     '''Iterable for Journal events'''
 
     syslog = logging.getLogger(f"root.{__name__}")
@@ -37,22 +98,25 @@ def edc_track_journal(journalpath, backlog=0):
         if isinstance(backlog, int):
             backlog = min(backlog, len(logfiles)-1)
             syslog.info(f"Reading journals, backlog = {backlog}")
-            return edc_read_journal(logfiles[-(1+backlog):])
+            return edc_read_journal(logfiles[-(1+backlog):], **read_kwargs)
         elif isinstance(backlog, str):
             syslog.info(f"Reading journals, backlog = {backlog}")
             return edc_read_journal(reduce(
                 lambda t, j: t if not t and backlog not in j else t + [j],
                 logfiles, []
-            )[1:])
+            )[1:], **read_kwargs)
 
 
     except KeyboardInterrupt as kbi:
         syslog.info(f"Keyboard Interrupt {kbi.info()}")
         pass
 
-def edc_read_journal(journal, notail=False):
+def edc_read_journal(journal, notail=False, decode=json.loads, events=None, skip=None, fields=None):
+    '''Iterable for the events in a journal file, see create_line_decoder
+    for filtering with events and skip and projecting with fields'''
     syslog = logging.getLogger(f"root.{__name__}")
-    
+    decode_line, accept = create_line_decoder(decode, events, skip, fields)
+
     try:
         syslog.info(f"\nReading journal: {journal}")
         with open(journal, encoding="utf-8") as journalfile:
@@ -75,33 +139,248 @@ def edc_read_journal(journal, notail=False):
                     continue
 
                 try:
-                    event = json.loads(line)
+                    event = decode_line(line)
 
                 except json.decoder.JSONDecodeError as JX:
                     print(JX)
                     print(line)
                     return
 
-                yield event
-        
-                if event.get('event', '') == 'Shutdown':
-                    syslog.info(f"SHUTDOWN {event.get('timestamp'):22} {journal}")
+                if event is not None:
+                    yield event
+
+                if _is_shutdown(line):
+                    syslog.info(f"SHUTDOWN {journal}")
                     break
 
-        yield dict(
+        event = accept(dict(
             event='JournalFinished',
             timestamp=datetime.datetime.now(datetime.timezone.utc).isoformat(),
             filename=f"{ntpath.basename(journal)}"
-        )
+        ))
+        if event is not None:
+            yield event
 
 
     except KeyboardInterrupt as kbi:
         syslog.info(f"Keyboard Interrupt")
-        yield dict(
+        event = accept(dict(
             event='KeyboardInterrupt',
             timestamp=datetime.datetime.utcnow().isoformat(),
             filename=f"{ntpath.basename(journal)}"
-        )
+        ))
+        if event is not None:
+            yield event
+
+# Bulk scanning ======================================
+
+def edc_scan_journals(logfiles, events, decode=json_loads):
+    '''Iterable for (logfile, offset, event) of only the named events.
+
+    Journal files are memory mapped and searched for the "event":"<Name>"
+    token, only the matching lines get decoded.'''
+
+    if isinstance(logfiles, str):
+        logfiles = [logfiles]
+    token = re.compile(rb'"event":\s*"(?:' + b'|'.join(re.escape(e.encode()) for e in events) + rb')"')
+
+    for logfile in logfiles:
+        with open(logfile, 'rb') as journalfile:
+            try:
+                mm = mmap.mmap(journalfile.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # empty file
+                continue
+
+            with mm:
+                for match in token.finditer(mm):
+                    start = mm.rfind(b'\n', 0, match.start()) + 1
+                    end = mm.find(b'\n', match.end())
+                    end = len(mm) if end < 0 else end
+                    try:
+                        yield logfile, start, decode(mm[start:end])
+                    except ValueError as JX:
+                        syslog.error(f"Skipping line at {start} in {logfile}: {JX}")
+
+# Tailing ============================================
+
+# inotify flags from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+
+class journalwatcher(dict):
+    def __getattr__(self, key):
+        return self[key]
+
+def create_inotify_watcher(journalpath):
+    '''Watch journalpath for changes using inotify, raises OSError when unavailable.
+
+    returns an object with the following members:
+        wait(timeout) blocks until something changed in journalpath or timeout
+        close() releases the inotify descriptor'''
+
+    libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    if not hasattr(libc, 'inotify_init1'):
+        raise OSError('inotify not supported')
+
+    fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    if fd < 0:
+        raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+    wd = libc.inotify_add_watch(
+        fd, os.fsencode(journalpath),
+        IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE)
+    if wd < 0:
+        os.close(fd)
+        raise OSError(ctypes.get_errno(), f'inotify_add_watch failed for {journalpath}')
+
+    def wait(timeout=None):
+        ready, _, _ = select.select([fd], [], [], timeout)
+        if not ready:
+            return False
+        # drain the pending notifications, we only care that something changed
+        try:
+            while os.read(fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close():
+        os.close(fd)
+
+    return journalwatcher(kind='inotify', wait=wait, close=close)
+
+def create_polling_watcher(journalpath, interval=0.3):
+    '''Fallback watcher, sleeps for interval seconds between looks at journalpath'''
+
+    def wait(timeout=None):
+        time.sleep(interval if timeout is None else min(interval, timeout))
+        return True
+
+    def close():
+        pass
+
+    return journalwatcher(kind='polling', wait=wait, close=close)
+
+def create_journal_watcher(journalpath):
+    '''Use inotify when the platform supports it, polling otherwise'''
+    try:
+        return create_inotify_watcher(journalpath)
+    except (OSError, AttributeError) as x:
+        syslog.info(f"No inotify for {journalpath} ({x}), polling instead")
+        return create_polling_watcher(journalpath)
+
+def edc_tail_journal(journal, watcher=None, chunksize=1024*1024, timeout=5.0, decode=json.loads, offset=0, cursor=None,
+                     events=None, skip=None, fields=None):
+    '''Follows a journal file, waiting on watcher for new data.
+
+    Reads appended bytes in chunks and keeps a trailing partial line
+    buffered until the game has written the rest of it. Ends with a
+    JournalFinished event as soon as a newer journal shows up in the
+    same directory.
+
+    Starts reading at byte offset, when a cursor dict is given its
+    'journal' and 'offset' are kept pointing just past the last
+    yielded event. See create_line_decoder for events, skip and fields.'''
+
+    journalpath = os.path.dirname(journal)
+    decode_line, accept = create_line_decoder(decode, events, skip, fields)
+    own_watcher = watcher is None
+    if own_watcher:
+        watcher = create_journal_watcher(journalpath)
+
+    try:
+        syslog.info(f"\nTailing journal: {journal}")
+        with open(journal, 'rb') as journalfile:
+            journalfile.seek(offset)
+            position = offset
+            cursor = cursor if cursor is not None else {}
+            cursor.update(journal=ntpath.basename(journal), offset=position)
+            pending = b''
+            while True:
+                chunk = journalfile.read(chunksize)
+                if chunk:
+                    lines = (pending + chunk).split(b'\n')
+                    pending = lines.pop()
+                    for line in lines:
+                        position += len(line) + 1
+                        if len(line) < 5:
+                            continue
+                        try:
+                            event = decode_line(line)
+                        except json.decoder.JSONDecodeError as JX:
+                            syslog.error(f"Skipping line in {journal}: {JX}")
+                            continue
+
+                        cursor['offset'] = position
+                        if event is not None:
+                            yield event
+                    continue
+
+                if ntpath.basename(edc_list_journals(journalpath)[-1]) != ntpath.basename(journal):
+                    # one more look, the game may have flushed between read and listdir
+                    if os.fstat(journalfile.fileno()).st_size > journalfile.tell():
+                        continue
+                    break
+
+                watcher.wait(timeout)
+
+        event = accept(dict(
+            event='JournalFinished',
+            timestamp=datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            filename=f"{ntpath.basename(journal)}"
+        ))
+        if event is not None:
+            yield event
+
+    except KeyboardInterrupt as kbi:
+        syslog.info(f"Keyboard Interrupt")
+        event = accept(dict(
+            event='KeyboardInterrupt',
+            timestamp=datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            filename=f"{ntpath.basename(journal)}"
+        ))
+        if event is not None:
+            yield event
+
+    finally:
+        if own_watcher:
+            watcher.close()
+
+def edc_follow_journals(journalpath, logfiles=None, watcher=None, timeout=5.0):
+    '''Iterable for journal filenames, yields logfiles and then every newer
+    journal as it appears in journalpath'''
+
+    logfiles = logfiles if logfiles is not None else edc_list_journals(journalpath)[-1:]
+    last_journal = ''
+    for logfile in logfiles:
+        last_journal = logfile
+        yield logfile
+
+    own_watcher = watcher is None
+    if own_watcher:
+        watcher = create_journal_watcher(journalpath)
+
+    try:
+        while True:
+            journals = edc_list_journals(journalpath)
+            names = [ntpath.basename(j) for j in journals]
+            last_name = ntpath.basename(last_journal)
+            newer = journals[names.index(last_name)+1:] if last_name in names else journals[-1:]
+            if not newer:
+                watcher.wait(timeout)
+                continue
+
+            for logfile in newer:
+                last_journal = logfile
+                yield logfile
+
+    finally:
+        if own_watcher:
+            watcher.close()
 
 # 
 
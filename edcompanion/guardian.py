@@ -0,0 +1,126 @@
+#pylint: disable=missing-module-docstring
+#pylint: disable=missing-function-docstring
+#pylint: disable=invalid-name
+
+from functools import lru_cache
+
+# Events that never count as guardian finds, they mention guardian
+# modules, materials or sites as part of normal play
+guardian_ignored = frozenset([
+    'Materials', 'Loadout', 'StoredModules',
+    'ModuleStore', 'ModuleRetrieve', 'ModuleBuy',
+    'ModuleSellRemote', 'MaterialCollected',
+    'CollectCargo', 'EjectCargo', 'Music', 'Cargo',
+    'Touchdown', 'Liftoff', 'ApproachSettlement',
+    'CodexEntry', 'Location', 'ModuleSell', 'Repair',
+    'TechnologyBroker', 'FetchRemoteModule', 'MaterialDiscovered',
+    'AfmuRepairs', 'JetConeDamage', '',
+])
+
+_factions = ('SystemFaction.Name', 'Factions[].Name', 'Factions[].Allegiance',
+             'Conflicts[].Faction1.Name', 'Conflicts[].Faction2.Name')
+_signals = ('BodyName', 'Signals[].Type', 'Signals[].Type_Localised',
+            'Genuses[].Genus', 'Genuses[].Genus_Localised')
+_missions = ('Name', 'LocalisedName', 'Faction', 'TargetFaction',
+             'DestinationSystem', 'DestinationStation', 'DestinationSettlement',
+             'NewDestinationSystem', 'NewDestinationStation', 'Commodity_Localised',
+             'MaterialsReward[].Name', 'MaterialsReward[].Name_Localised',
+             'CommodityReward[].Name', 'CommodityReward[].Name_Localised',
+             'FactionEffects[].Faction')
+
+# The string fields per event type that can carry guardian markers.
+# Event types not listed here are checked as a whole.
+guardian_fields = {
+    'FSDJump': ('StarSystem', 'SystemAllegiance', 'Body', 'Powers[]') + _factions,
+    'CarrierJump': ('StarSystem', 'SystemAllegiance', 'Body', 'StationName', 'StationFaction.Name', 'Powers[]') + _factions,
+    'Docked': ('StarSystem', 'StationName', 'StationType', 'StationFaction.Name', 'StationAllegiance'),
+    'Scan': ('BodyName', 'StarSystem'),
+    'ScanBaryCentre': ('StarSystem',),
+    'FSSSignalDiscovered': ('SignalName', 'SignalName_Localised', 'SignalType',
+                            'USSType', 'USSType_Localised', 'SpawningFaction', 'SpawningFaction_Localised'),
+    'SAASignalsFound': _signals,
+    'FSSBodySignals': _signals,
+    'FSSDiscoveryScan': ('SystemName',),
+    'FSSAllBodiesFound': ('SystemName',),
+    'SAAScanComplete': ('BodyName',),
+    'DataScanned': ('Type', 'Type_Localised'),
+    'StartJump': ('StarSystem',),
+    'FSDTarget': ('Name',),
+    'SupercruiseEntry': ('StarSystem',),
+    'SupercruiseExit': ('StarSystem', 'Body', 'BodyType'),
+    'SupercruiseDestinationDrop': ('Type', 'Type_Localised'),
+    'ApproachBody': ('StarSystem', 'Body'),
+    'LeaveBody': ('StarSystem', 'Body'),
+    'Embark': ('StarSystem', 'Body', 'StationName'),
+    'Disembark': ('StarSystem', 'Body', 'StationName'),
+    'Screenshot': ('System', 'Body'),
+    'ReceiveText': ('From', 'From_Localised', 'Message', 'Message_Localised'),
+    'SendText': ('To', 'Message'),
+    'MissionAccepted': _missions,
+    'MissionCompleted': _missions,
+    'MissionRedirected': _missions,
+    'MissionFailed': ('Name', 'LocalisedName'),
+    'MissionAbandoned': ('Name', 'LocalisedName'),
+    'Bounty': ('Target', 'Target_Localised', 'VictimFaction', 'Rewards[].Faction'),
+    'FactionKillBond': ('AwardingFaction', 'AwardingFaction_Localised', 'VictimFaction', 'VictimFaction_Localised'),
+    'ShipTargeted': ('Ship', 'Ship_Localised', 'PilotName', 'PilotName_Localised', 'Faction'),
+    'MarketBuy': ('Type', 'Type_Localised'),
+    'MarketSell': ('Type', 'Type_Localised'),
+    'Synthesis': ('Name', 'Materials[].Name'),
+    'EngineerCraft': ('Engineer', 'Blueprint', 'Slot', 'Module'),
+    'FuelScoop': (),
+    'ReservoirReplenished': (),
+    'Shutdown': (),
+}
+
+def _split_path(path):
+    return tuple(part for part in path.replace('[]', '.[]').split('.') if part)
+
+_guardian_paths = {
+    eventname: tuple(_split_path(p) for p in paths)
+    for eventname, paths in guardian_fields.items()
+}
+
+def _collect(value, path, found):
+    if not path:
+        if isinstance(value, str):
+            found.append(value)
+        return
+    if path[0] == '[]':
+        if isinstance(value, list):
+            for item in value:
+                _collect(item, path[1:], found)
+    elif isinstance(value, dict) or hasattr(value, 'get'):
+        item = value.get(path[0])
+        if item is not None:
+            _collect(item, path[1:], found)
+
+def guardian_text(eventname, event):
+    '''The text of an event that may mention guardians'''
+    paths = _guardian_paths.get(eventname)
+    if paths is None:
+        return str(event)
+
+    found = []
+    for path in paths:
+        _collect(event, path, found)
+    return '\n'.join(found)
+
+def is_guardian_event(eventname, event):
+    '''Decides if an event is a guardian find worth keeping, names like
+    "Guardians of ..." factions do not count'''
+    if eventname in guardian_ignored or event.get('IsStation'):
+        return False
+    text = guardian_text(eventname, event)
+    return 'guardian' in text.lower() and 'Guardians of' not in text
+
+@lru_cache(1024)
+def is_signal_event(eventname):
+    lower = eventname.lower()
+    return 'scan' in lower or 'signal' in lower
+
+def is_guardian_signal(eventname, event):
+    '''Decides if a scan or signal event mentions guardians'''
+    if not is_signal_event(eventname) or event.get('IsStation'):
+        return False
+    return 'guardian' in guardian_text(eventname, event).lower()
@@ -0,0 +1,160 @@
+#pylint: disable=missing-module-docstring
+#pylint: disable=missing-function-docstring
+#pylint: disable=invalid-name
+
+import os
+import json
+import logging
+import ntpath
+import datetime
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import pyarrow.dataset as ds
+except ImportError:
+    pa = pq = ds = None
+
+from edcompanion.events import edc_list_journals, edc_read_journal, json_loads
+from edcompanion.persistence import write_json_file
+
+syslog = logging.getLogger(f"root.{__name__}")
+
+# Identifiers stay integers, every other number is stored as float64 so
+# columns keep the same type across journals.
+integer_fields = set([
+    'SystemAddress', 'BodyID', 'MarketID', 'MissionID', 'ShipID',
+    'Count', 'BodyCount', 'NonBodyCount', 'ProbesUsed', 'EfficiencyTarget',
+])
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("The journal archive needs pyarrow, pip install pyarrow")
+
+def _column_type(field, values):
+    kinds = set(type(v) for v in values if v is not None)
+    if not kinds:
+        return None
+    if kinds == {bool}:
+        return pa.bool_()
+    if kinds <= {int, float}:
+        return pa.int64() if field in integer_fields and kinds == {int} else pa.float64()
+    if kinds == {str}:
+        return pa.string()
+    return None
+
+def flatten_events(events):
+    '''Arrow table for a list of same-named events. Top level scalars
+    become typed columns, everything else is kept as JSON in `extra`.'''
+    _require_pyarrow()
+
+    fields = []
+    for event in events:
+        for k in event:
+            if k not in ('event', 'timestamp') and k not in fields:
+                fields.append(k)
+
+    columns = dict(
+        timestamp=pa.array(
+            [datetime.datetime.fromisoformat(e.get('timestamp', '1970-01-01T00:00:00Z').replace('Z', '+00:00')) for e in events],
+            type=pa.timestamp('s', tz='UTC')),
+    )
+    extra = [dict() for e in events]
+    for field in fields:
+        values = [e.get(field) for e in events]
+        column_type = _column_type(field, values)
+        if column_type is None:
+            for x, e in zip(extra, events):
+                if field in e:
+                    x[field] = e[field]
+        else:
+            columns[field] = pa.array(values, type=column_type)
+
+    columns['extra'] = pa.array([json.dumps(x) if x else None for x in extra], type=pa.string())
+    return pa.table(columns)
+
+def _archive_journal(journal, archive_path):
+    name = ntpath.basename(journal)
+    grouped = {}
+    for event in edc_read_journal(journal, notail=True, decode=json_loads):
+        eventname = event.get('event')
+        if not eventname or eventname == 'JournalFinished':
+            continue
+        month = event.get('timestamp', '1970-01')[:7]
+        grouped.setdefault((eventname, month), []).append(event)
+
+    parts = []
+    for (eventname, month), events in grouped.items():
+        part_path = os.path.join(archive_path, f"event={eventname}", f"month={month}")
+        os.makedirs(part_path, exist_ok=True)
+        part_file = os.path.join(part_path, f"{name}.parquet")
+        pq.write_table(flatten_events(events), part_file)
+        parts.append(os.path.relpath(part_file, archive_path))
+
+    return parts
+
+def update_journal_archive(journalpath, archive_path='data/archive'):
+    '''Converts new and changed journals into a parquet dataset partitioned
+    by event name and month, returns the names of the archived journals'''
+    _require_pyarrow()
+
+    state_file = os.path.join(archive_path, '_journals.json')
+    try:
+        with open(state_file, 'rt') as jsonfile:
+            state = json.load(jsonfile)
+    except Exception as x:
+        state = {}
+
+    archived = []
+    for logfile in edc_list_journals(journalpath):
+        name = ntpath.basename(logfile)
+        stat = os.stat(logfile)
+        entry = state.get(name, {})
+        if entry.get('size') == stat.st_size and entry.get('mtime') == stat.st_mtime:
+            continue
+
+        # a grown journal may no longer write to all of its old parts
+        for part in entry.get('parts', []):
+            try:
+                os.remove(os.path.join(archive_path, part))
+            except FileNotFoundError:
+                pass
+
+        state[name] = dict(size=stat.st_size, mtime=stat.st_mtime, parts=_archive_journal(logfile, archive_path))
+        archived.append(name)
+
+    if archived:
+        os.makedirs(archive_path, exist_ok=True)
+        write_json_file(state_file, json.dumps(state))
+        syslog.info(f"Archived {len(archived)} journals into {archive_path}")
+
+    return archived
+
+def open_journal_archive(archive_path='data/archive', events=None):
+    '''pyarrow dataset over the archive, optionally limited to event names'''
+    _require_pyarrow()
+
+    paths = []
+    for eventname in sorted(os.listdir(archive_path)):
+        if not eventname.startswith('event='):
+            continue
+        if events and eventname[6:] not in events:
+            continue
+        for root, _, files in os.walk(os.path.join(archive_path, eventname)):
+            paths += [os.path.join(root, f) for f in files if f.endswith('.parquet')]
+
+    partition_schema = pa.schema([('event', pa.string()), ('month', pa.string())])
+    schema = pa.unify_schemas(
+        [pq.read_schema(p) for p in paths] + [partition_schema],
+        promote_options='permissive')
+    partitioning = ds.partitioning(partition_schema, flavor='hive')
+    return ds.dataset(paths, schema=schema, format='parquet',
+                      partitioning=partitioning, partition_base_dir=archive_path)
+
+def query_journal_archive(archive_path='data/archive', events=None, columns=None, filter=None):
+    '''Pandas DataFrame from the archive, e.g. all Scan events with a TerraformState:
+        query_journal_archive(events=['Scan'], filter=ds.field('TerraformState') != '')'''
+    dataset = open_journal_archive(archive_path, events)
+    if columns:
+        columns = [c for c in columns if c in dataset.schema.names]
+    return dataset.to_table(columns=columns, filter=filter).to_pandas()
@@ -0,0 +1,160 @@
+#pylint: disable=missing-module-docstring
+#pylint: disable=missing-function-docstring
+#pylint: disable=invalid-name
+
+import os
+import re
+import json
+import bisect
+import logging
+import ntpath
+
+from edcompanion.events import edc_list_journals, peek_event_name, json_loads
+from edcompanion.persistence import write_json_file
+
+syslog = logging.getLogger(f"root.{__name__}")
+
+catalog_version = 1
+_timestamp_bytes = re.compile(rb'"timestamp":\s*"([^"]*)"')
+
+def _peek_timestamp(line):
+    match = _timestamp_bytes.search(line)
+    return match.group(1).decode() if match else ''
+
+def scan_journal(journal, entry=None, every=1000):
+    '''Index a journal file, continues from entry when the file only grew.
+
+    The entry holds size, mtime, first and last timestamp, commander,
+    game version, a histogram of event names and a sparse list of
+    [offset, event number, timestamp] every `every` events.'''
+
+    stat = os.stat(journal)
+    if not entry or entry.get('size', 0) > stat.st_size or entry.get('every') != every:
+        entry = dict(
+            size=0, mtime=0, count=0, every=every,
+            first_timestamp='', last_timestamp='',
+            commander='', gameversion='',
+            events={}, offsets=[])
+
+    offset = entry['size']
+    with open(journal, 'rb') as journalfile:
+        journalfile.seek(offset)
+        for line in journalfile:
+            if not line.endswith(b'\n'):
+                # partial line, pick it up on the next update
+                break
+
+            line_offset = offset
+            offset += len(line)
+            if len(line) < 5:
+                continue
+
+            name = peek_event_name(line)
+            if name is None:
+                continue
+
+            timestamp = _peek_timestamp(line)
+            if entry['count'] % every == 0:
+                entry['offsets'].append([line_offset, entry['count'], timestamp])
+
+            entry['count'] += 1
+            entry['events'][name] = entry['events'].get(name, 0) + 1
+            entry['first_timestamp'] = entry['first_timestamp'] or timestamp
+            entry['last_timestamp'] = timestamp or entry['last_timestamp']
+
+            if name in ('Fileheader', 'Commander', 'LoadGame'):
+                try:
+                    event = json_loads(line)
+                except ValueError:
+                    continue
+                entry['gameversion'] = event.get('gameversion', entry['gameversion'])
+                entry['commander'] = event.get('Name', event.get('Commander', entry['commander']))
+
+    entry['size'] = offset
+    entry['mtime'] = stat.st_mtime
+    return entry
+
+def load_journal_catalog(catalog_file='journal_catalog.json'):
+    try:
+        with open(catalog_file, 'rt') as jsonfile:
+            catalog = json.load(jsonfile)
+        if catalog.get('version') == catalog_version:
+            return catalog
+    except Exception as x:
+        syslog.info(f"Starting new journal catalog ({x})")
+
+    return dict(version=catalog_version, journals={})
+
+def save_journal_catalog(catalog, catalog_file='journal_catalog.json'):
+    write_json_file(catalog_file, json.dumps(catalog))
+
+def update_journal_catalog(journalpath, catalog_file='journal_catalog.json', every=1000):
+    '''Brings the on-disk catalog up to date, only files with a changed
+    size or mtime are (re)scanned'''
+
+    catalog = load_journal_catalog(catalog_file)
+    journals = catalog['journals']
+    changed = False
+
+    logfiles = edc_list_journals(journalpath)
+    catalog['order'] = [ntpath.basename(f) for f in logfiles]
+    for logfile in logfiles:
+        name = ntpath.basename(logfile)
+        stat = os.stat(logfile)
+        entry = journals.get(name)
+        if entry and entry.get('size') == stat.st_size and entry.get('mtime') == stat.st_mtime:
+            continue
+
+        journals[name] = scan_journal(logfile, entry, every=every)
+        changed = True
+
+    for name in set(journals) - set(catalog['order']):
+        journals.pop(name)
+        changed = True
+
+    if changed:
+        save_journal_catalog(catalog, catalog_file)
+
+    return catalog
+
+def catalog_journals(catalog, since=None, events=None):
+    '''Names of the cataloged journals with events at or after since,
+    containing at least one of events'''
+    events = set(events) if events else None
+    return [
+        name for name in catalog.get('order', [])
+        if name in catalog['journals']
+        and (not since or catalog['journals'][name].get('last_timestamp', '') >= since)
+        and (events is None or events & set(catalog['journals'][name].get('events', {})))
+    ]
+
+def catalog_offset(entry, since=None):
+    '''Byte offset to start reading a journal for events at or after since'''
+    if not since or not entry.get('offsets'):
+        return 0
+    stamps = [o[2] for o in entry['offsets']]
+    index = bisect.bisect_left(stamps, since) - 1
+    return entry['offsets'][index][0] if index >= 0 else 0
+
+def edc_replay_journals(journalpath, since=None, events=None, catalog=None, catalog_file='journal_catalog.json'):
+    '''Iterable for journal events since a timestamp, optionally limited to
+    event names, using the catalog to skip files and seek into them'''
+
+    catalog = catalog or update_journal_catalog(journalpath, catalog_file)
+    events = set(events) if events else None
+
+    for name in catalog_journals(catalog, since, events):
+        entry = catalog['journals'][name]
+        with open(os.path.join(journalpath, name), 'rb') as journalfile:
+            journalfile.seek(catalog_offset(entry, since))
+            for line in journalfile:
+                if len(line) < 5:
+                    continue
+                if events is not None and peek_event_name(line) not in events:
+                    continue
+                if since and _peek_timestamp(line) < since:
+                    continue
+                try:
+                    yield json_loads(line)
+                except ValueError as JX:
+                    syslog.error(f"Skipping line in {name}: {JX}")
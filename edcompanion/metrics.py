@@ -0,0 +1,248 @@
+#pylint: disable=missing-module-docstring
+#pylint: disable=missing-function-docstring
+#pylint: disable=invalid-name
+
+import json
+import time
+import threading
+import logging
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+syslog = logging.getLogger(f"root.{__name__}")
+
+# Upper bounds in seconds of the histogram buckets, the last one is open
+histogram_bounds = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 30, 60, float('inf'))
+
+def create_histogram(bounds=histogram_bounds):
+    """Creates a histogram of durations in fixed buckets
+
+    returns an object with the following members:
+        observe(seconds) adds a duration
+        percentile(q) upper bound of the bucket holding the q-th percentile
+        snapshot() dict with count, mean, max, p50, p90, p99 and the
+            count per bucket"""
+
+    class histogramfactory(dict):
+        def __getattr__(self, key):
+            return self[key]
+
+    counts = [0] * len(bounds)
+    state = dict(count=0, total=0.0, max=0.0)
+
+    def observe(seconds):
+        for i, bound in enumerate(bounds):
+            if seconds <= bound:
+                counts[i] += 1
+                break
+        state['count'] += 1
+        state['total'] += seconds
+        state['max'] = max(state['max'], seconds)
+
+    def percentile(q):
+        if not state['count']:
+            return None
+        needed = q / 100 * state['count']
+        seen = 0
+        for bound, count in zip(bounds, counts):
+            seen += count
+            if seen >= needed:
+                return min(bound, state['max'])
+        return state['max']
+
+    def snapshot():
+        return dict(
+            count=state['count'],
+            mean=state['total'] / state['count'] if state['count'] else None,
+            max=state['max'],
+            p50=percentile(50), p90=percentile(90), p99=percentile(99),
+            buckets={f"le_{bound}":count for bound, count in zip(bounds, counts) if count})
+
+    return histogramfactory(
+        observe=observe,
+        percentile=percentile,
+        snapshot=snapshot)
+
+def create_worker_metrics(name, window=60.0):
+    """Creates counters, histograms and gauges for a pool of worker threads
+
+    returns an object with the following members:
+        name
+        queued(), dropped(), coalesced(), cancelled() count tasks put
+            on the queue, or not
+        started(waited) a thread took a task after waited seconds in
+            the queue, returns the start time for finished()
+        finished(started, failed=False) the task ended
+        gauge(depth) sets the callable giving the queue depth
+        snapshot() dict of counts, depth, busy threads with the seconds
+            their task is running, tasks per second over the last window
+            seconds and the wait and exec histograms"""
+
+    class metricsfactory(dict):
+        def __getattr__(self, key):
+            return self[key]
+
+    lock = threading.Lock()
+    counts = dict(queued=0, dropped=0, coalesced=0, cancelled=0, started=0, completed=0, errors=0)
+    wait_histogram = create_histogram()
+    exec_histogram = create_histogram()
+    running = {}    # thread name -> start time of its task
+    recent = deque(maxlen=100000)  # end times of recent tasks
+    state = dict(depth=lambda: None, created=time.monotonic())
+
+    def counter(key):
+        def count():
+            with lock:
+                counts[key] += 1
+        return count
+
+    def started(waited):
+        now = time.monotonic()
+        with lock:
+            counts['started'] += 1
+            wait_histogram.observe(waited)
+            running[threading.current_thread().name] = now
+        return now
+
+    def finished(start, failed=False):
+        now = time.monotonic()
+        with lock:
+            counts['completed'] += 1
+            if failed:
+                counts['errors'] += 1
+            exec_histogram.observe(now - start)
+            recent.append(now)
+            running.pop(threading.current_thread().name, None)
+
+    def gauge(depth):
+        state['depth'] = depth
+
+    def snapshot():
+        now = time.monotonic()
+        # the gauge may take the pool's lock, never call it holding ours
+        depth = state['depth']()
+        with lock:
+            while recent and recent[0] < now - window:
+                recent.popleft()
+            return dict(
+                counts=dict(counts),
+                depth=depth,
+                busy={thread:round(now - start, 3) for thread, start in running.items()},
+                throughput=len(recent) / min(window, max(now - state['created'], 1e-3)),
+                mean_throughput=counts['completed'] / (now - state['created']),
+                wait=wait_histogram.snapshot(),
+                exec=exec_histogram.snapshot())
+
+    return metricsfactory(
+        name=name,
+        queued=counter('queued'),
+        dropped=counter('dropped'),
+        coalesced=counter('coalesced'),
+        cancelled=counter('cancelled'),
+        started=started,
+        finished=finished,
+        gauge=gauge,
+        snapshot=snapshot)
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+def get_worker_metrics(name):
+    '''The metrics registered under name, created on first use, so workers
+    created again under the same name keep counting'''
+    with _registry_lock:
+        if name not in _registry:
+            _registry[name] = create_worker_metrics(name)
+        return _registry[name]
+
+def metrics_snapshot():
+    '''Dict of name -> snapshot for every registered worker'''
+    with _registry_lock:
+        registered = list(_registry.values())
+    return {metrics.name:metrics.snapshot() for metrics in registered}
+
+def _ms(seconds):
+    return '-' if seconds is None else f"{1000*seconds:.1f}"
+
+def metrics_report(snapshot=None):
+    '''Registered worker metrics as text, one line per worker'''
+    snapshot = snapshot if snapshot is not None else metrics_snapshot()
+    lines = ["worker metrics:"]
+    for name, m in sorted(snapshot.items()):
+        c = m['counts']
+        busy = max(m['busy'].values()) if m['busy'] else 0
+        lines.append(
+            f"{name:20} depth {m['depth'] if m['depth'] is not None else '-':>5} "
+            f"done {c['completed']:7} err {c['errors']:4} drop {c['dropped']:5} "
+            f"{m['throughput'] or 0:7.1f}/s "
+            f"wait p50/p99 {_ms(m['wait']['p50'])}/{_ms(m['wait']['p99'])} ms "
+            f"exec p50/p99 {_ms(m['exec']['p50'])}/{_ms(m['exec']['p99'])} ms "
+            f"busy {len(m['busy'])} longest {busy:.1f} s")
+    return '\n'.join(lines)
+
+def create_metrics_logger(interval=300.0, logger=syslog):
+    """Creates a thread logging the metrics report every interval seconds
+
+    returns an object with the following members:
+        start(), stop(), join()"""
+
+    class loggerfactory(dict):
+        def __getattr__(self, key):
+            return self[key]
+
+    stop_event = threading.Event()
+
+    def run():
+        while not stop_event.wait(interval):
+            logger.info(metrics_report())
+
+    thread = threading.Thread(target=run, name='metrics-logger', daemon=True)
+
+    return loggerfactory(
+        start=thread.start,
+        stop=stop_event.set,
+        join=thread.join)
+
+def create_metrics_server(port=8765, host='127.0.0.1'):
+    """Creates an HTTP server answering GET /metrics with the metrics
+    snapshot as JSON and GET /metrics.txt with the report
+
+    returns an object with the following members:
+        address (host, port) the server listens on
+        start(), stop(), join()"""
+
+    class serverfactory(dict):
+        def __getattr__(self, key):
+            return self[key]
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.startswith('/metrics.txt'):
+                body, content_type = metrics_report().encode(), 'text/plain'
+            elif self.path.startswith('/metrics'):
+                body, content_type = json.dumps(metrics_snapshot(), indent=2).encode(), 'application/json'
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            syslog.debug(format, *args)
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True)
+
+    def stop():
+        server.shutdown()
+        server.server_close()
+
+    return serverfactory(
+        address=server.server_address,
+        start=thread.start,
+        stop=stop,
+        join=thread.join)
@@ -0,0 +1,93 @@
+#pylint: disable=missing-module-docstring
+#pylint: disable=missing-function-docstring
+#pylint: disable=invalid-name
+
+import numpy as np
+
+# Up to this many destinations the route is solved exactly
+exact_limit = 10
+
+def distance_matrix(points):
+    """Matrix of euclidean distances between all rows of points (n, 3)"""
+    points = np.asarray(points, dtype=float)
+    delta = points[:, np.newaxis, :] - points[np.newaxis, :, :]
+    return np.sqrt(np.sum(np.square(delta), axis=-1))
+
+def jump_matrix(distances, jumpdistance=25):
+    """Number of jumps for every leg, as calculate_total_jumps counts them"""
+    return 1 + np.floor(np.asarray(distances) / jumpdistance).astype(np.int64)
+
+def _exact_order(costs):
+    # Held-Karp on the cost to go: best[mask, i] is the cheapest way to visit
+    # all destinations in mask starting from node i, destinations are 1..n
+    n = len(costs) - 1
+    full = (1 << n) - 1
+    bits = np.arange(n)
+    best = np.zeros((full + 1, n + 1), dtype=np.int64)
+    for mask in range(1, full + 1):
+        members = bits[(mask >> bits) & 1 == 1]
+        rest = best[mask ^ (1 << members), members + 1]
+        best[mask] = np.min(costs[:, members + 1] + rest, axis=1)
+
+    # walk forward taking the first destination that stays on an optimal
+    # route, this gives the same order as sorting all permutations
+    order = [0]
+    mask = full
+    while mask:
+        current = order[-1]
+        for j in bits[(mask >> bits) & 1 == 1]:
+            if costs[current, j + 1] + best[mask ^ (1 << j), j + 1] == best[mask, current]:
+                order.append(int(j) + 1)
+                mask ^= 1 << j
+                break
+    return order
+
+def _route_cost(order, costs):
+    return sum(costs[a, b] for a, b in zip(order, order[1:]))
+
+def _heuristic_order(costs):
+    # nearest neighbour from the start, improved with 2-opt moves on the
+    # open path, the start stays in front
+    n = len(costs)
+    order = [0]
+    left = set(range(1, n))
+    while left:
+        current = order[-1]
+        nearest = min(left, key=lambda j: (costs[current, j], j))
+        order.append(nearest)
+        left.remove(nearest)
+
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, n - 1):
+            for k in range(i + 1, n):
+                # reverse order[i:k+1]
+                before = costs[order[i - 1], order[i]]
+                after = costs[order[i - 1], order[k]]
+                if k + 1 < n:
+                    before += costs[order[k], order[k + 1]]
+                    after += costs[order[i], order[k + 1]]
+                if after < before - 1e-9:
+                    order[i:k + 1] = order[i:k + 1][::-1]
+                    improved = True
+    return order
+
+def best_visiting_order(points, jumpdistance=25):
+    """Order in which to visit points (n, 3), starting at the first,
+    with the least number of jumps
+
+    returns the list of indices and the total number of jumps"""
+    points = np.asarray(points, dtype=float)
+    if len(points) < 2:
+        return list(range(len(points))), 0
+
+    distances = distance_matrix(points)
+    jumps = jump_matrix(distances, jumpdistance)
+    if len(points) - 1 <= exact_limit:
+        order = _exact_order(jumps)
+    else:
+        # break ties between equal jump counts on distance
+        order = _heuristic_order(jumps + distances / (1 + distances.max()))
+
+    return order, int(_route_cost(order, jumps))
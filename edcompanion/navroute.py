@@ -6,36 +6,115 @@ import os
 import json
 import logging
 
+syslog = logging.getLogger(f"root.{__name__}")
 
+neutron_file = 'collected_neutron_systems.jsonl'
+legacy_neutron_file = 'collected_neutron_systems.json'
 
-def edc_navigationroute(journalpath):
-    '''Iterable for Navigation Route files'''
+def load_neutron_systems(filename=neutron_file, legacy_file=legacy_neutron_file):
+    '''Dict of system name -> route item for every neutron star collected so far'''
+    systems = {}
+    try:
+        with open(legacy_file, "rt") as jsonfile:
+            systems.update(json.load(jsonfile))
+    except Exception as x:
+        pass
 
-    syslog = logging.getLogger(f"root.{__name__}")
-    currentdb = {}
     try:
-        try:
-            with open('collected_neutron_systems.json', "rt") as jsonfile:
-                currentdb=json.load(jsonfile)
-        except Exception as x:
-            currentdb = {}
+        with open(filename, "rt") as jsonfile:
+            for line in jsonfile:
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    # a line cut short by a crash
+                    continue
+                systems[item.get('StarSystem')] = item
+    except FileNotFoundError:
+        pass
 
-        navfile = os.path.join(journalpath, "NavRoute.json")
-        syslog.debug(f"\Reading Navigation Route from {navfile}")
-        if os.path.exists(navfile):
-            with open(navfile, "rt") as jsonfile:
-                for item in json.load(jsonfile).get('Route'):
-                    if item.get('StarClass','') == 'N':
-                        currentdb.update({item.get('StarSystem'):item})
+    return systems
 
-                    yield item
+def create_neutron_store(filename=neutron_file, legacy_file=legacy_neutron_file):
+    """Creates an append-only store of neutron star systems, only systems not
+    seen before are written, one JSON line each
+
+    returns an object with the following members:
+        add(items) stores the neutron stars among route items, returns
+            the number of new systems
+        systems() dict of system name -> route item"""
+
+    class storefactory(dict):
+        def __getattr__(self, key):
+            return self[key]
+
+    known = load_neutron_systems(filename, legacy_file)
+
+    def add(items):
+        new_items = [
+            item for item in items
+            if item.get('StarClass','') == 'N' and item.get('StarSystem') not in known
+        ]
+        if not new_items:
+            return 0
 
         try:
-            with open('collected_neutron_systems.json', "wt") as jsonfile:
-                json.dump(currentdb, jsonfile, indent=2)
+            with open(filename, "at") as jsonfile:
+                jsonfile.write(''.join(json.dumps(item) + '\n' for item in new_items))
         except Exception as x:
-            pass
+            syslog.error(f"Error writing {filename}: {x}")
+            return 0
 
-    except KeyboardInterrupt as kbi:
-        syslog.debug(f"Keyboard Interrupt")
-        pass
+        known.update({item.get('StarSystem'):item for item in new_items})
+        return len(new_items)
+
+    return storefactory(
+        add=add,
+        systems=lambda: known)
+
+_neutron_stores = {}
+_route_cache = {}
+
+def get_neutron_store(filename=neutron_file):
+    if filename not in _neutron_stores:
+        _neutron_stores[filename] = create_neutron_store(filename)
+    return _neutron_stores[filename]
+
+def _read_route(journalpath):
+    navfile = os.path.join(journalpath, "NavRoute.json")
+    try:
+        stat = os.stat(navfile)
+    except FileNotFoundError:
+        return [], {}
+
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached = _route_cache.get(navfile)
+    if cached and cached[0] == key:
+        return cached[1], cached[2]
+
+    syslog.debug(f"Reading Navigation Route from {navfile}")
+    try:
+        with open(navfile, "rt") as jsonfile:
+            route = json.load(jsonfile).get('Route') or []
+    except ValueError as x:
+        # the game may be writing the file, keep the previous route until it is complete
+        syslog.debug(f"Incomplete Navigation Route {navfile}: {x}")
+        return (cached[1], cached[2]) if cached else ([], {})
+
+    systems = {item.get('StarSystem'):item for item in route}
+    _route_cache[navfile] = (key, route, systems)
+    get_neutron_store().add(route)
+    return route, systems
+
+def read_navigationroute(journalpath):
+    '''List of route items in NavRoute.json, the file is only parsed
+    again after its modification time or size changed'''
+    return _read_route(journalpath)[0]
+
+def navigationroute_systems(journalpath):
+    '''Dict of system name -> route item for the current route, shared
+    between callers so copy it before making changes'''
+    return _read_route(journalpath)[1]
+
+def edc_navigationroute(journalpath):
+    '''Iterable for Navigation Route files'''
+    yield from read_navigationroute(journalpath)
@@ -0,0 +1,138 @@
+#pylint: disable=missing-module-docstring
+#pylint: disable=missing-function-docstring
+#pylint: disable=invalid-name
+
+import os
+import json
+import time
+import threading
+import logging
+
+syslog = logging.getLogger(f"root.{__name__}")
+
+def write_json_file(filename, text):
+    '''Writes text next to filename, then renames it into place'''
+    tmp_file = f"{filename}.tmp"
+    with open(tmp_file, 'wt') as jsonfile:
+        jsonfile.write(text)
+    os.replace(tmp_file, filename)
+
+def create_document_writer(delay=2.0, indent=3, lock=None):
+    """Creates a background thread writing JSON documents to disk
+
+    Documents are registered by filename and marked changed by the event
+    loop, which bumps their version. The thread writes a changed document
+    at most once every delay seconds, and only when its version moved on
+    since it was last written. Empty documents are not written.
+
+    lock: held by the thread while serializing a document, the event loop
+    holds it while changing the documents
+
+    returns an object with the following members:
+        register(filename, document) adds a document to keep on disk
+        touch(filename) marks a document as changed
+        put(filename, document) replaces a document and marks it changed,
+            a str is taken as the JSON text already serialized
+        flush() writes all changed documents now, waits until done
+        start() starts the writer thread
+        stop() writes the changed documents and ends the thread
+        join()"""
+
+    class writerfactory(dict):
+        def __getattr__(self, key):
+            return self[key]
+
+    condition = threading.Condition()
+    documents = {}
+    versions = {}       # filename -> version, bumped by touch
+    written = {}        # filename -> version last written
+    dirty = {}          # filename -> time it is due
+    stop_event = threading.Event()
+    writing = False
+
+    def register(filename, document):
+        with condition:
+            documents[filename] = document
+
+    def touch(filename):
+        with condition:
+            versions[filename] = versions.get(filename, 0) + 1
+            if filename not in dirty:
+                dirty[filename] = time.monotonic() + delay
+                condition.notify_all()
+
+    def put(filename, document):
+        with condition:
+            documents[filename] = document
+        touch(filename)
+
+    def _dumps(filename):
+        # the version is taken with the text, a touch while writing writes again
+        if isinstance(documents[filename], str):
+            return versions.get(filename), documents[filename]
+        if lock is None:
+            return versions.get(filename), json.dumps(documents[filename], indent=indent)
+        with lock:
+            return versions.get(filename), json.dumps(documents[filename], indent=indent)
+
+    def _write(filename):
+        if not documents.get(filename) or written.get(filename) == versions.get(filename):
+            return
+        try:
+            version, text = _dumps(filename)
+            write_json_file(filename, text)
+            written[filename] = version
+        except Exception as x:
+            syslog.exception('Error writing %s: %s', filename, str(x))
+
+    def _due_all():
+        for filename in documents:
+            dirty[filename] = 0
+
+    def flush():
+        with condition:
+            _due_all()
+            condition.notify_all()
+            while (dirty or writing) and writer.is_alive():
+                condition.wait(0.1)
+
+    def writeloop():
+        nonlocal writing
+        while True:
+            with condition:
+                now = time.monotonic()
+                due = [f for f, t in dirty.items() if t <= now]
+                if not due:
+                    if stop_event.is_set():
+                        break
+                    condition.wait(max(0.01, min(dirty.values()) - now) if dirty else None)
+                    continue
+                for filename in due:
+                    dirty.pop(filename, None)
+                writing = True
+
+            for filename in due:
+                _write(filename)
+
+            with condition:
+                writing = False
+                condition.notify_all()
+
+        syslog.debug('Ending document writer')
+
+    writer = threading.Thread(target=writeloop, daemon=True)
+
+    def stop():
+        with condition:
+            _due_all()
+            stop_event.set()
+            condition.notify_all()
+
+    return writerfactory(
+        register=register,
+        touch=touch,
+        put=put,
+        flush=flush,
+        start=writer.start,
+        stop=stop,
+        join=writer.join)
@@ -0,0 +1,219 @@
+#pylint: disable=missing-module-docstring
+#pylint: disable=missing-function-docstring
+#pylint: disable=invalid-name
+
+import os
+import json
+import time
+import threading
+import itertools
+import logging
+
+import numpy as np
+import requests
+
+from edcompanion.persistence import write_json_file
+
+syslog = logging.getLogger(f"root.{__name__}")
+
+edastro_url = 'https://edastro.com/gec/json/all'
+poi_snapshot_file = os.path.join('data', 'edastro_poi.json')
+
+def create_point_index(points, cellsize=500.0):
+    """Creates a uniform grid index over points (n, 3)
+
+    returns an object with the following members:
+        nearest(point, k=1) indices and distances of the k nearest points
+        within(point, radius) indices and distances of points within radius
+        near_segment(a, b, radius) indices and distances of points within
+            radius of the line segment from a to b"""
+
+    class indexfactory(dict):
+        def __getattr__(self, key):
+            return self[key]
+
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    point_cells = np.floor(points / cellsize).astype(np.int64)
+    cells = {}
+    for i, cell in enumerate(map(tuple, point_cells)):
+        cells.setdefault(cell, []).append(i)
+    cells = {cell:np.asarray(members) for cell, members in cells.items()}
+    nothing = (np.zeros(0, dtype=np.int64), np.zeros(0))
+
+    def _cell(point):
+        return np.floor(np.asarray(point, dtype=float) / cellsize).astype(np.int64)
+
+    def _candidates(lo, hi):
+        # visit the cells of the box, or check all points when the box
+        # holds more cells than are occupied
+        if np.prod(hi - lo + 1) > len(cells):
+            return np.flatnonzero(np.all((point_cells >= lo) & (point_cells <= hi), axis=1))
+        found = [
+            cells[cell]
+            for cell in itertools.product(*[range(l, h + 1) for l, h in zip(lo, hi)])
+            if cell in cells
+        ]
+        return np.concatenate(found) if found else nothing[0]
+
+    def _sorted(indices, distances, limit=None):
+        ordering = np.argsort(distances, kind='stable')[:limit]
+        return indices[ordering], distances[ordering]
+
+    def nearest(point, k=1):
+        if not len(points):
+            return nothing
+        point = np.asarray(point, dtype=float)
+        center = _cell(point)
+        ring = 0
+        while True:
+            lo, hi = center - ring, center + ring
+            if np.prod(hi - lo + 1) > len(cells):
+                indices = np.arange(len(points))
+            else:
+                indices = _candidates(lo, hi)
+            if len(indices) >= min(k, len(points)):
+                complete = len(indices) == len(points)
+                distances = np.linalg.norm(points[indices] - point, axis=1)
+                indices, distances = _sorted(indices, distances, k)
+                # everything outside the box is at least ring cells away
+                if complete or distances[-1] <= ring * cellsize:
+                    return indices, distances
+            ring += 1
+
+    def within(point, radius):
+        if not len(points):
+            return nothing
+        point = np.asarray(point, dtype=float)
+        indices = _candidates(_cell(point - radius), _cell(point + radius))
+        distances = np.linalg.norm(points[indices] - point, axis=1)
+        keep = distances <= radius
+        return _sorted(indices[keep], distances[keep])
+
+    def near_segment(a, b, radius):
+        if not len(points):
+            return nothing
+        a = np.asarray(a, dtype=float)
+        b = np.asarray(b, dtype=float)
+        indices = _candidates(_cell(np.minimum(a, b) - radius), _cell(np.maximum(a, b) + radius))
+        direction = b - a
+        length2 = np.dot(direction, direction)
+        offsets = points[indices] - a
+        t = np.clip(offsets @ direction / length2, 0, 1) if length2 else np.zeros(len(indices))
+        distances = np.linalg.norm(offsets - t[:, np.newaxis] * direction, axis=1)
+        keep = distances <= radius
+        return _sorted(indices[keep], distances[keep])
+
+    return indexfactory(
+        points=points,
+        nearest=nearest,
+        within=within,
+        near_segment=near_segment)
+
+def parse_edastro_poi(items):
+    '''Dict of system name -> POI from the EDAstro GEC list'''
+    return {
+        item.get('galMapSearch'):{
+            c:item.get(c) for c in ['coordinates','name','region','type','summary']
+        }
+        for item in items
+    }
+
+def fetch_edastro_poi(url=edastro_url, filename=poi_snapshot_file):
+    '''Downloads the EDAstro POI list and keeps a snapshot of it in filename'''
+    req = requests.get(url)
+    items = req.json()
+    if filename:
+        if os.path.dirname(filename):
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+        write_json_file(filename, json.dumps(items))
+    return items
+
+def load_edastro_poi(filename=poi_snapshot_file):
+    '''The POI list from the snapshot and its age in seconds, or None'''
+    try:
+        with open(filename, 'rt') as jsonfile:
+            return json.load(jsonfile), time.time() - os.path.getmtime(filename)
+    except FileNotFoundError:
+        return None, None
+    except Exception as x:
+        syslog.error(f"Ignoring POI snapshot {filename}: {x}")
+        return None, None
+
+def create_poi_search(filename=poi_snapshot_file, max_age=86400, url=edastro_url):
+    """Points of interest from the local EDAstro snapshot, refreshed on a
+    background thread when missing or older than max_age seconds
+
+    returns an object with the following members:
+        pois dict of system name -> POI, updated in place on refresh
+        nearest(point, k=1) list of (distance, system name)
+        within(point, radius) list of (distance, system name)
+        near_segment(a, b, radius) list of (distance, system name)
+        find_nearest_poi(coord1, coord2=None) coordinates and
+            (system name, name, summary) of the POI with the least
+            summed distance to both points
+        refresh() downloads the list now"""
+
+    class searchfactory(dict):
+        def __getattr__(self, key):
+            return self[key]
+
+    pois = {}
+    # names and index are swapped together when a refresh completes
+    current = dict(search=([], create_point_index([])))
+
+    def _use(items):
+        new_pois = parse_edastro_poi(items)
+        names = [k for k, i in new_pois.items() if i.get('coordinates')]
+        index = create_point_index([new_pois[k]['coordinates'] for k in names])
+        current['search'] = (names, index)
+        pois.update(new_pois)
+        for k in set(pois) - set(new_pois):
+            pois.pop(k, None)
+        syslog.debug(f"Indexed {len(names)} points of interest")
+
+    def refresh():
+        try:
+            _use(fetch_edastro_poi(url, filename))
+        except Exception as x:
+            syslog.error(f"Could not refresh points of interest: {x}")
+
+    def nearest(point, k=1):
+        names, index = current['search']
+        return [(float(d), names[i]) for i, d in zip(*index.nearest(point, k))]
+
+    def within(point, radius):
+        names, index = current['search']
+        return [(float(d), names[i]) for i, d in zip(*index.within(point, radius))]
+
+    def near_segment(a, b, radius):
+        names, index = current['search']
+        return [(float(d), names[i]) for i, d in zip(*index.near_segment(a, b, radius))]
+
+    def find_nearest_poi(coord1, coord2=None):
+        p1 = np.asarray(coord1, dtype=float)
+        p2 = np.asarray(coord2, dtype=float) if coord2 is not None else p1
+        names, index = current['search']
+        first, _ = index.nearest(p1)
+        if not len(first):
+            return None, None
+        # points with a smaller summed distance lie within half of it from the middle
+        bound = np.linalg.norm(index.points[first[0]] - p1) + np.linalg.norm(index.points[first[0]] - p2)
+        indices, _ = index.within((p1 + p2) / 2, bound / 2 + 1e-6)
+        summed = np.linalg.norm(index.points[indices] - p1, axis=1) + np.linalg.norm(index.points[indices] - p2, axis=1)
+        best = indices[np.argmin(summed)]
+        name = names[best]
+        return index.points[best], (name, pois.get(name, {}).get('name'), pois.get(name, {}).get('summary'))
+
+    items, age = load_edastro_poi(filename)
+    if items is not None:
+        _use(items)
+    if items is None or age > max_age:
+        threading.Thread(target=refresh, daemon=True).start()
+
+    return searchfactory(
+        pois=pois,
+        nearest=nearest,
+        within=within,
+        near_segment=near_segment,
+        find_nearest_poi=find_nearest_poi,
+        refresh=refresh)
@@ -0,0 +1,220 @@
+#pylint: disable=missing-module-docstring
+#pylint: disable=missing-function-docstring
+#pylint: disable=invalid-name
+
+import os
+import json
+import random
+import datetime
+
+# Relative weights of the kinds of activity in a session
+event_mixes = {
+    'exploration': dict(jump=30, scan=30, starscan=8, discovery=5, bodysignals=5, saasignals=5,
+                        saacomplete=4, signal=6, fuelscoop=5, music=5, screenshot=1, codex=2, text=2),
+    'missions': dict(jump=20, accept=10, redirect=4, complete=6, missions=2, scan=10, starscan=4,
+                     fuelscoop=4, music=5, text=6, docking=10),
+    'combat': dict(jump=8, interdicted=10, music=25, bounty=20, shiptarget=30, underattack=15,
+                   fuelscoop=2, text=10, scan=4),
+}
+
+sector_names = ['Synuefe', 'Col 285 Sector', 'HIP 2', 'Prae Flyi', 'Outotz']
+guardian_materials = ['guardian_powercell', 'guardian_wreckagecomponents', 'guardian_sentinel_weaponparts']
+
+def _system_name(rng):
+    sector = rng.choice(sector_names)
+    return f"{sector} {rng.choice('ABCDEFGH')}{rng.choice('XYZ')}-{rng.randint(0, 9)} {rng.choice('abcd')}{rng.randint(0, 30)}"
+
+def _starpos(rng, near=None):
+    if near is None:
+        return [round(rng.uniform(-1000, 6000), 3), round(rng.uniform(-500, 100), 3), round(rng.uniform(1000, 14000), 3)]
+    return [round(c + rng.uniform(-30, 30), 3) for c in near]
+
+def _jump(rng, state):
+    system = _system_name(rng)
+    state['starpos'] = _starpos(rng, state['starpos'])
+    state['system'] = system
+    fuel_used = round(rng.uniform(1, 4), 6)
+    state['fuel'] = max(1.0, round(state['fuel'] - fuel_used, 6))
+    return [
+        dict(event='StartJump', JumpType='Hyperspace', StarSystem=system, StarClass=rng.choice('KGMFABN')),
+        dict(event='FSDJump', StarSystem=system, StarPos=state['starpos'], SystemAddress=rng.randint(1, 10**12),
+             Body=system, BodyID=0, BodyType='Star', JumpDist=round(rng.uniform(5, 40), 3),
+             FuelUsed=fuel_used, FuelLevel=state['fuel'],
+             SystemAllegiance=rng.choice(['', '', '', 'Independent', 'Guardian']),
+             Factions=[dict(Name=f"{system} Party", Influence=0.6), dict(Name=f"{system} League", Influence=0.4)]),
+        dict(event='FSDTarget', Name=_system_name(rng), StarClass=rng.choice('KGMFABN'), RemainingJumpsInRoute=rng.randint(0, 20)),
+    ]
+
+def _scan(rng, state):
+    body = rng.randint(1, 20)
+    return [dict(event='Scan', ScanType='Detailed', BodyName=f"{state['system']} {body}", BodyID=body,
+                 StarSystem=state['system'], DistanceFromArrivalLS=round(rng.uniform(10, 5000), 3),
+                 PlanetClass=rng.choice(['Water world', 'Rocky body', 'Icy body', 'Earthlike body', 'High metal content body']),
+                 TerraformState=rng.choice(['', '', 'Terraformable']),
+                 WasDiscovered=rng.random() < .5, WasMapped=False)]
+
+def _starscan(rng, state):
+    return [dict(event='Scan', ScanType='AutoScan', BodyName=f"{state['system']} A", BodyID=0,
+                 StarSystem=state['system'], StarType=rng.choice('KGMFABON'), Subclass=rng.randint(0, 9),
+                 StellarMass=round(rng.uniform(0.1, 20), 3), WasDiscovered=rng.random() < .5)]
+
+def _discovery(rng, state):
+    return [dict(event='FSSDiscoveryScan', Progress=round(rng.random(), 3), BodyCount=rng.randint(1, 40),
+                 NonBodyCount=rng.randint(0, 10), SystemName=state['system'])]
+
+def _bodysignals(rng, state):
+    body = rng.randint(1, 20)
+    return [dict(event='FSSBodySignals', BodyName=f"{state['system']} {body}", BodyID=body,
+                 Signals=[dict(Type='$SAA_SignalType_Biological;', Type_Localised='Biological', Count=rng.randint(1, 5))])]
+
+def _saasignals(rng, state):
+    body = rng.randint(1, 20)
+    kind = rng.choice(['Biological', 'Geological', 'Guardian'])
+    return [dict(event='SAASignalsFound', BodyName=f"{state['system']} {body}", BodyID=body,
+                 Signals=[dict(Type=f"$SAA_SignalType_{kind};", Type_Localised=kind, Count=rng.randint(1, 5))])]
+
+def _saacomplete(rng, state):
+    body = rng.randint(1, 20)
+    return [dict(event='SAAScanComplete', BodyName=f"{state['system']} {body}", BodyID=body,
+                 ProbesUsed=rng.randint(3, 10), EfficiencyTarget=rng.randint(4, 8))]
+
+def _signal(rng, state):
+    return [dict(event='FSSSignalDiscovered', SystemAddress=1, SignalName='$USS;',
+                 SignalName_Localised=rng.choice(['Unidentified signal source', 'Guardian Beacon', 'Ancient Ruins', 'Notable stellar phenomena']))]
+
+def _fuelscoop(rng, state):
+    state['fuel'] = min(32.0, round(state['fuel'] + 5, 6))
+    return [dict(event='FuelScoop', Scooped=5.0, Total=state['fuel'])]
+
+def _music(rng, state):
+    return [dict(event='Music', MusicTrack=rng.choice(['Exploration', 'Supercruise', 'Combat_Unknown', 'Combat_Dogfight']))]
+
+def _screenshot(rng, state):
+    return [dict(event='Screenshot', Filename='\\ED_Pictures\\Screenshot_0000.bmp', System=state['system'], Body=state['system'])]
+
+def _codex(rng, state):
+    return [dict(event='CodexEntry', Name='$Codex_Ent_Guardian_Beacons;', Category='$Codex_Category_Civilisations;',
+                 SubCategory='$Codex_SubCategory_Guardian;', System=state['system'])]
+
+def _text(rng, state):
+    return [dict(event='ReceiveText', From='npc', Message='$Pirate_OnStartScanCargo07;', Channel='npc')]
+
+def _accept(rng, state):
+    state['mission_id'] += 1
+    state['missions'].append(state['mission_id'])
+    return [dict(event='MissionAccepted', MissionID=state['mission_id'], Name='Mission_Delivery',
+                 LocalisedName=rng.choice(['Deliver data', 'Courier job', 'Source goods']),
+                 DestinationSystem=_system_name(rng), DestinationStation='Port', Expiry='2030-01-01T00:00:00Z')]
+
+def _redirect(rng, state):
+    if not state['missions']:
+        return _accept(rng, state)
+    return [dict(event='MissionRedirected', MissionID=rng.choice(state['missions']),
+                 NewDestinationSystem=_system_name(rng), NewDestinationStation='Port')]
+
+def _complete(rng, state):
+    if not state['missions']:
+        return _accept(rng, state)
+    mission_id = state['missions'].pop(rng.randrange(len(state['missions'])))
+    return [dict(event=rng.choice(['MissionCompleted', 'MissionCompleted', 'MissionAbandoned']), MissionID=mission_id)]
+
+def _missions(rng, state):
+    return [dict(event='Missions', Active=[dict(MissionID=m) for m in state['missions']], Failed=[], Complete=[])]
+
+def _docking(rng, state):
+    return [dict(event=rng.choice(['DockingRequested', 'DockingGranted', 'Docked', 'Undocked']), StationName='Port')]
+
+def _interdicted(rng, state):
+    return [dict(event='Interdicted', Submitted=rng.random() < .5, Interdictor='Pirate', IsPlayer=False)]
+
+def _bounty(rng, state):
+    return [dict(event='Bounty', Target='viper', VictimFaction='Pirates', TotalReward=rng.randint(1000, 100000))]
+
+def _shiptarget(rng, state):
+    return [dict(event='ShipTargeted', TargetLocked=True, Ship='viper', ScanStage=rng.randint(0, 3))]
+
+def _underattack(rng, state):
+    return [dict(event='UnderAttack', Target='You')]
+
+_builders = dict(
+    jump=_jump, scan=_scan, starscan=_starscan, discovery=_discovery, bodysignals=_bodysignals,
+    saasignals=_saasignals, saacomplete=_saacomplete, signal=_signal, fuelscoop=_fuelscoop, music=_music,
+    screenshot=_screenshot, codex=_codex, text=_text, accept=_accept, redirect=_redirect, complete=_complete,
+    missions=_missions, docking=_docking, interdicted=_interdicted, bounty=_bounty, shiptarget=_shiptarget,
+    underattack=_underattack)
+
+def _session_start(rng, state):
+    return [
+        dict(event='Fileheader', part=1, language='English/UK', Odyssey=True, gameversion='4.0.0.1', build='r1 '),
+        dict(event='Commander', FID='F0', Name='Jameson'),
+        dict(event='Materials', Raw=[dict(Name='iron', Count=rng.randint(0, 300))], Encoded=[],
+             Manufactured=[dict(Name=m, Count=rng.randint(0, 300)) for m in guardian_materials]),
+        dict(event='Rank', Combat=1, Trade=1, Explore=5),
+        dict(event='LoadGame', Commander='Jameson', Ship='krait_light', ShipID=3, FuelLevel=state['fuel'], FuelCapacity=32.0),
+        dict(event='Loadout', Ship='krait_light', ShipID=3, ShipIdent='AB-01', MaxJumpRange=45.5,
+             FuelCapacity=dict(Main=32.0, Reserve=0.63), Modules=[dict(Slot='FrameShiftDrive', Item='int_hyperdrive_size5_class5')]),
+        dict(event='Location', StarSystem=state['system'], StarPos=state['starpos'], SystemAddress=1,
+             Body=state['system'], BodyID=0, BodyType='Star', SystemAllegiance=''),
+        dict(event='Missions', Active=[dict(MissionID=m) for m in state['missions']], Failed=[], Complete=[]),
+    ]
+
+def synthetic_events(count=1000, mix='exploration', seed=None, start=None, interval=10.0, state=None):
+    '''Iterable for count synthetic journal events of a session, mix is
+    the name of one of event_mixes or a dict of activity -> weight, the
+    seconds between events are exponentially distributed around interval.
+    Pass the same state dict to continue a previous session.'''
+    rng = random.Random(seed)
+    weights = event_mixes[mix] if isinstance(mix, str) else mix
+    activities = list(weights)
+    state = state if state is not None else {}
+    if not state:
+        state.update(system=_system_name(rng), starpos=_starpos(rng), fuel=32.0, mission_id=1000, missions=[],
+                     time=start or datetime.datetime(2030, 1, 1, tzinfo=datetime.timezone.utc))
+
+    def stamped(event):
+        state['time'] += datetime.timedelta(seconds=round(rng.expovariate(1 / interval)))
+        return dict(timestamp=state['time'].strftime('%Y-%m-%dT%H:%M:%SZ'), **event)
+
+    produced = 0
+    for event in _session_start(rng, state):
+        if produced < count:
+            produced += 1
+            yield stamped(event)
+
+    while produced < count:
+        activity = rng.choices(activities, [weights[a] for a in activities])[0]
+        for event in _builders[activity](rng, state):
+            if produced < count:
+                produced += 1
+                yield stamped(event)
+
+def synthetic_route(count=20, seed=None, start=None):
+    '''NavRoute.json contents for count systems along a line from start'''
+    rng = random.Random(seed)
+    position = start or _starpos(rng)
+    route = []
+    for i in range(count):
+        route.append(dict(StarSystem=_system_name(rng), SystemAddress=rng.randint(1, 10**12),
+                          StarPos=[round(c + 40 * i, 3) for c in position], StarClass=rng.choice('KGMFABN')))
+    return dict(timestamp=datetime.datetime.now(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'), event='NavRoute', Route=route)
+
+def write_synthetic_journals(journalpath, journals=3, events=1000, mix='exploration', seed=7, interval=10.0):
+    '''Writes journals Journal.*.log files of events each, and a NavRoute.json,
+    to journalpath, returns the journal filenames in order'''
+    os.makedirs(journalpath, exist_ok=True)
+    state = {}
+    filenames = []
+    for n in range(journals):
+        session = list(synthetic_events(events, mix, seed=None if seed is None else seed + n, interval=interval, state=state))
+        started = datetime.datetime.strptime(session[0]['timestamp'], '%Y-%m-%dT%H:%M:%SZ')
+        filename = os.path.join(journalpath, f"Journal.{started.strftime('%Y-%m-%dT%H%M%S')}.01.log")
+        with open(filename, 'wt') as journalfile:
+            journalfile.write(''.join(json.dumps(event) + '\n' for event in session))
+        filenames.append(filename)
+        # the next session starts a while later
+        state['time'] += datetime.timedelta(hours=1)
+
+    with open(os.path.join(journalpath, 'NavRoute.json'), 'wt') as jsonfile:
+        json.dump(synthetic_route(seed=seed, start=state['starpos']), jsonfile, indent=2)
+
+    return filenames
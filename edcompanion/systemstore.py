@@ -0,0 +1,217 @@
+#pylint: disable=missing-module-docstring
+#pylint: disable=missing-function-docstring
+#pylint: disable=invalid-name
+
+import os
+import glob
+import json
+import sqlite3
+import logging
+from collections import OrderedDict
+
+syslog = logging.getLogger(f"root.{__name__}")
+
+_schema = '''
+create table if not exists systems (
+    name text primary key,
+    address integer,
+    starpos text,
+    created text,
+    data text
+);
+create index if not exists systems_address on systems(address);
+create table if not exists bodies (
+    system text,
+    body_id text,
+    is_star integer,
+    data text,
+    primary key (system, body_id)
+);
+create table if not exists signals (
+    system text,
+    eventname text,
+    body text,
+    data text,
+    primary key (system, eventname, body)
+);
+create table if not exists discovery (
+    system text,
+    eventname text,
+    data text,
+    primary key (system, eventname)
+);
+'''
+
+# system keys kept in their own tables or columns
+_row_keys = ('StarPos', 'created', 'bodies', 'stars')
+
+def create_system_store(filename='data/systems.sqlite', cache_size=64):
+    """Creates a SQLite backed store of visited star systems, keyed by name
+    and system address, with an LRU of recently used systems.
+
+    A system is the same dict follow_journal always used: StarPos, created,
+    bodies and stars by body id, discovery scans by event name and signals
+    by event name and body name. Changes are written as single rows.
+
+    returns an object with the following members:
+        get_system(name=None, address=None) cached system dict or None
+        has_system(name) true when the system is known
+        create_system(name, starpos, created, address=None, bodies=None)
+        upsert_system(name, system) writes the system level fields
+        upsert_body(name, body_id, body, is_star=False)
+        upsert_signals(name, eventname, body, signals)
+        upsert_discovery(name, eventname, data)
+        commit() makes pending changes durable
+        close()"""
+
+    class storefactory(dict):
+        def __getattr__(self, key):
+            return self[key]
+
+    if os.path.dirname(filename):
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+    connection = sqlite3.connect(filename)
+    connection.execute('pragma journal_mode=wal')
+    connection.execute('pragma synchronous=normal')
+    connection.executescript(_schema)
+
+    cache = OrderedDict()
+
+    def _cached(name, system):
+        cache[name] = system
+        cache.move_to_end(name)
+        while len(cache) > cache_size:
+            cache.popitem(last=False)
+        return system
+
+    def _load(name):
+        row = connection.execute(
+            'select name, address, starpos, created, data from systems where name = ?', (name,)).fetchone()
+        if row is None:
+            return None
+
+        system = json.loads(row[4]) if row[4] else {}
+        system['StarPos'] = json.loads(row[2]) if row[2] else []
+        if row[3]:
+            system['created'] = row[3]
+        system['bodies'] = {}
+        system['stars'] = {}
+        for body_id, is_star, data in connection.execute(
+                'select body_id, is_star, data from bodies where system = ?', (name,)):
+            system['bodies'][body_id] = json.loads(data)
+            if is_star:
+                system['stars'][body_id] = system['bodies'][body_id]
+        for eventname, data in connection.execute(
+                'select eventname, data from discovery where system = ?', (name,)):
+            system[eventname] = json.loads(data)
+        for eventname, body, data in connection.execute(
+                'select eventname, body, data from signals where system = ?', (name,)):
+            system.setdefault(eventname, {})[body] = json.loads(data)
+        return system
+
+    def get_system(name=None, address=None):
+        if name is None and address is not None:
+            row = connection.execute('select name from systems where address = ?', (address,)).fetchone()
+            name = row[0] if row else None
+        if not name:
+            return None
+        if name in cache:
+            cache.move_to_end(name)
+            return cache[name]
+        system = _load(name)
+        return _cached(name, system) if system is not None else None
+
+    def has_system(name):
+        return name in cache or connection.execute(
+            'select 1 from systems where name = ?', (name,)).fetchone() is not None
+
+    def upsert_system(name, system, address=None):
+        data = {
+            k:v for k, v in system.items()
+            if k not in _row_keys and not isinstance(v, dict)
+        }
+        connection.execute(
+            '''insert into systems (name, address, starpos, created, data) values (?, ?, ?, ?, ?)
+               on conflict(name) do update set
+                   address = coalesce(excluded.address, address),
+                   starpos = excluded.starpos, created = excluded.created, data = excluded.data''',
+            (name, address, json.dumps(system.get('StarPos', [])), system.get('created'), json.dumps(data)))
+
+    def upsert_body(name, body_id, body, is_star=False):
+        connection.execute(
+            'insert or replace into bodies (system, body_id, is_star, data) values (?, ?, ?, ?)',
+            (name, str(body_id), int(bool(is_star)), json.dumps(body)))
+
+    def upsert_signals(name, eventname, body, signals):
+        connection.execute(
+            'insert or replace into signals (system, eventname, body, data) values (?, ?, ?, ?)',
+            (name, eventname, body, json.dumps(signals)))
+
+    def upsert_discovery(name, eventname, data):
+        connection.execute(
+            'insert or replace into discovery (system, eventname, data) values (?, ?, ?)',
+            (name, eventname, json.dumps(data)))
+
+    def create_system(name, starpos, created, address=None, bodies=None):
+        system = dict(StarPos=list(starpos), bodies={}, created=created, stars={})
+        upsert_system(name, system, address)
+        for body_id, body in (bodies or {}).items():
+            is_star = body.get('BodyType', '') == 'Star' or 'StarType' in body
+            system['bodies'][str(body_id)] = body
+            if is_star:
+                system['stars'][str(body_id)] = body
+            upsert_body(name, body_id, body, is_star)
+        return _cached(name, system)
+
+    def commit():
+        connection.commit()
+
+    def close():
+        connection.commit()
+        connection.close()
+        cache.clear()
+
+    return storefactory(
+        get_system=get_system,
+        has_system=has_system,
+        create_system=create_system,
+        upsert_system=upsert_system,
+        upsert_body=upsert_body,
+        upsert_signals=upsert_signals,
+        upsert_discovery=upsert_discovery,
+        commit=commit,
+        close=close)
+
+def import_sector_files(store, sectorpath='data/sectors'):
+    '''Copies the systems from the old per-sector JSON files into the store,
+    returns the number of systems imported'''
+    count = 0
+    for sector_file in sorted(glob.glob(os.path.join(sectorpath, '*.json'))):
+        try:
+            with open(sector_file, 'rt') as jsonfile:
+                sector = json.load(jsonfile)
+        except Exception as x:
+            syslog.error(f"Skipping {sector_file}: {x}")
+            continue
+
+        for name, system in sector.items():
+            if store.has_system(name):
+                continue
+            stored = store.create_system(
+                name, system.get('StarPos', []), system.get('created'), bodies=system.get('bodies', {}))
+            for key, value in system.items():
+                if key in _row_keys:
+                    continue
+                if isinstance(value, dict) and all(isinstance(v, list) for v in value.values()) and value:
+                    for body, signals in value.items():
+                        store.upsert_signals(name, key, body, signals)
+                elif isinstance(value, dict):
+                    store.upsert_discovery(name, key, value)
+                stored[key] = value
+            store.upsert_system(name, stored)
+            count += 1
+
+    store.commit()
+    if count:
+        syslog.info(f"Imported {count} systems from {sectorpath}")
+    return count
@@ -0,0 +1,148 @@
+#pylint: disable=missing-module-docstring
+#pylint: disable=missing-function-docstring
+#pylint: disable=invalid-name
+
+import numpy as np
+
+def create_series(size=256, alpha=0.1):
+    """Creates a fixed size ring buffer of numbers with statistics kept up
+    to date on every add
+
+    returns an object with the following members:
+        add(value) adds a value, None is ignored
+        count() number of values added in total
+        last(default=None) most recent value
+        mean(default=None) mean of all values added
+        ewma(default=None) exponentially weighted moving average
+        percentile(q, default=None) percentile of the recent values
+        recent() the recent values, oldest first
+        snapshot() / restore(state) for checkpoints"""
+
+    class seriesfactory(dict):
+        def __getattr__(self, key):
+            return self[key]
+
+    buffer = np.zeros(size)
+    state = dict(count=0, total=0.0, ewma=None, position=0, filled=0)
+
+    def add(value):
+        if value is None:
+            return
+        buffer[state['position']] = value
+        state['position'] = (state['position'] + 1) % size
+        state['filled'] = min(state['filled'] + 1, size)
+        state['count'] += 1
+        state['total'] += value
+        state['ewma'] = value if state['ewma'] is None else alpha * value + (1 - alpha) * state['ewma']
+
+    def recent():
+        if state['filled'] < size:
+            return buffer[:state['filled']].copy()
+        return np.roll(buffer, -state['position'])
+
+    def last(default=None):
+        return float(buffer[state['position'] - 1]) if state['filled'] else default
+
+    def mean(default=None):
+        return state['total'] / state['count'] if state['count'] else default
+
+    def ewma(default=None):
+        return state['ewma'] if state['ewma'] is not None else default
+
+    def percentile(q, default=None):
+        return float(np.percentile(buffer[:state['filled']], q)) if state['filled'] else default
+
+    def snapshot():
+        return dict(count=state['count'], total=state['total'], ewma=state['ewma'], values=recent().tolist())
+
+    def restore(saved):
+        saved_values = saved.get('values', [])[-size:]
+        buffer[:len(saved_values)] = saved_values
+        state.update(
+            count=saved.get('count', len(saved_values)), total=saved.get('total', float(sum(saved_values))),
+            ewma=saved.get('ewma'), position=len(saved_values) % size, filled=len(saved_values))
+
+    return seriesfactory(
+        add=add,
+        count=lambda: state['count'],
+        last=last,
+        mean=mean,
+        ewma=ewma,
+        percentile=percentile,
+        recent=recent,
+        snapshot=snapshot,
+        restore=restore)
+
+def create_session_telemetry(size=256, alpha=0.1):
+    """Creates fuel and jump statistics for a session
+
+    returns an object with the following members:
+        fuel_per_jump, seconds_per_jump, scoop_rate series, see create_series
+        jump(timestamp, fuel_used, fuel_level) records an FSD jump
+        entry(timestamp, fuel_level=None) records entering the game
+        fuel(level, timestamp=None) records a new fuel level, with a
+            timestamp it also counts towards the scoop rate
+        fuel_level(default=None) last known fuel level
+        last_entry(default=None) time of the last jump or entry
+        estimated_jumps(default_fuel=3) jumps left on the current fuel
+        snapshot() / restore(state) for checkpoints"""
+
+    class telemetryfactory(dict):
+        def __getattr__(self, key):
+            return self[key]
+
+    fuel_per_jump = create_series(size, alpha)
+    seconds_per_jump = create_series(size, alpha)
+    scoop_rate = create_series(size, alpha)
+    state = dict(fuel_level=None, last_entry=None, last_scoop=None)
+
+    def fuel(level, timestamp=None):
+        if level is None:
+            return
+        if timestamp is not None:
+            last_scoop = state['last_scoop']
+            # consecutive FuelScoop events while scooping from the same star
+            if last_scoop and 0 < timestamp - last_scoop[0] < 60 and level > last_scoop[1]:
+                scoop_rate.add((level - last_scoop[1]) / (timestamp - last_scoop[0]))
+            state['last_scoop'] = (timestamp, level)
+        state['fuel_level'] = level
+
+    def entry(timestamp, fuel_level=None):
+        state['last_entry'] = timestamp
+        fuel(fuel_level)
+
+    def jump(timestamp, fuel_used, fuel_level):
+        if state['last_entry'] is not None:
+            seconds_per_jump.add(timestamp - state['last_entry'])
+        fuel_per_jump.add(fuel_used)
+        entry(timestamp, fuel_level)
+
+    def estimated_jumps(default_fuel=3):
+        return state['fuel_level'] / (.1 + fuel_per_jump.mean(default_fuel))
+
+    def snapshot():
+        return dict(
+            fuel_level=state['fuel_level'],
+            last_entry=state['last_entry'],
+            fuel_per_jump=fuel_per_jump.snapshot(),
+            seconds_per_jump=seconds_per_jump.snapshot(),
+            scoop_rate=scoop_rate.snapshot())
+
+    def restore(saved):
+        state.update(fuel_level=saved.get('fuel_level'), last_entry=saved.get('last_entry'))
+        fuel_per_jump.restore(saved.get('fuel_per_jump', {}))
+        seconds_per_jump.restore(saved.get('seconds_per_jump', {}))
+        scoop_rate.restore(saved.get('scoop_rate', {}))
+
+    return telemetryfactory(
+        fuel_per_jump=fuel_per_jump,
+        seconds_per_jump=seconds_per_jump,
+        scoop_rate=scoop_rate,
+        jump=jump,
+        entry=entry,
+        fuel=fuel,
+        fuel_level=lambda default=None: state['fuel_level'] if state['fuel_level'] is not None else default,
+        last_entry=lambda default=None: state['last_entry'] if state['last_entry'] is not None else default,
+        estimated_jumps=estimated_jumps,
+        snapshot=snapshot,
+        restore=restore)
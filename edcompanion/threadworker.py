@@ -1,6 +1,10 @@
 import threading
 import queue
 import time
+from collections import deque
+from concurrent.futures import Future
+
+from edcompanion.metrics import get_worker_metrics
 
 import logging
 
@@ -102,77 +106,343 @@ def create_threaded_worker(workerfunc, **put_kwargs):
         get_return=get_item,
         join=task_processor.join)
 
-def create_producer_from_iterable(iterable, **put_kwargs):
-    """Create a producer thread encapsulating an iterable"""
+# Policies for a full task queue
+BLOCK = 'block'         # put waits until there is room
+DROP = 'drop'           # put discards the new task
+COALESCE = 'coalesce'   # a new task replaces a waiting task with the same key,
+                        # otherwise the oldest waiting task is discarded
+
+_STOP = object()        # sentinel ending a worker thread
+
+def create_worker_pool(workerfunc, workers=1, maxsize=0, policy=BLOCK, key=None, name=None):
+    """Creates a pool of threads taking tasks from a shared queue,
+    workerfunc is called for each item put on the queue. Idle threads
+    block on the queue, stop() queues a sentinel for every thread after
+    the tasks already waiting.
+
+    workerfunc: the function to be executed for each item
+    workers: the number of threads
+    maxsize: the maximum number of waiting tasks, 0 for no limit
+    policy: what put does when the queue is full, BLOCK, DROP or COALESCE
+    key: key(*work_args, **work_kwargs) identifying tasks to coalesce,
+        by default the arguments themselves
+
+    returns an object with the following members:
+        start() starts the threads
+        put(item, **work_args) puts item and optional keyword arguments
+            on the queue for processing by workerfunc(), returns False
+            when the task was dropped
+        submit(item, **work_args) like put, returns a
+            concurrent.futures.Future for the result of workerfunc(),
+            wait on it with result(timeout) or add_done_callback(), it
+            is cancelled when the task is dropped and can be cancelled
+            until the task starts, exceptions are raised by result()
+        get_return() next result of workerfunc() for a put item that
+            was not None, or None
+        waiting() number of tasks waiting in the queue
+        metrics the worker metrics registered under name, see
+            edcompanion.metrics
+        stop() lets the threads end once the queue is empty
+        join() waits for the threads to end"""
 
     class workerfactory(dict):
         def __getattr__(self, key):
             return self[key]
 
-    stop_event = threading.Event()
-    product_queue = queue.Queue(maxsize=15)
+    if policy not in (BLOCK, DROP, COALESCE):
+        raise ValueError(f"Unknown queue policy {policy}")
+
+    name = name or getattr(workerfunc, '__name__', 'worker')
+    key = key or (lambda *work_args, **work_kwargs: (work_args, tuple(sorted(work_kwargs.items()))))
+    condition = threading.Condition()
+    tasks = deque()
+    pending = {}        # coalesce key -> task waiting in tasks
+    done_queue = queue.Queue()
+    state = dict(stopping=False)
+    metrics = get_worker_metrics(name)
+
+    def waiting():
+        with condition:
+            return len(tasks) - (tasks.count(_STOP) if state['stopping'] else 0)
+
+    metrics.gauge(waiting)
+
+    def _queue_task(work_args, work_kwargs, future=None):
+        # the metrics are counted after releasing condition, the depth gauge
+        # takes condition while the metrics snapshot holds its own lock
+        outcomes = []
+        queued = _put_task(work_args, work_kwargs, future, outcomes)
+        for outcome in outcomes:
+            getattr(metrics, outcome)()
+        return queued
+
+    def _put_task(work_args, work_kwargs, future, outcomes):
+        # a task is [work_args, work_kwargs, key, futures, collect, queued],
+        # collect tells to also put the result on the done queue for get_return
+        with condition:
+            if state['stopping']:
+                outcomes.append('dropped')
+                return False
+
+            task_key = None
+            if policy == COALESCE:
+                try:
+                    task_key = key(*work_args, **work_kwargs)
+                    waiting_task = pending.get(task_key)
+                except TypeError:
+                    # unhashable arguments are never coalesced
+                    task_key, waiting_task = None, None
+                if waiting_task is not None:
+                    waiting_task[0], waiting_task[1] = work_args, work_kwargs
+                    if future is not None:
+                        waiting_task[3].append(future)
+                    waiting_task[4] = waiting_task[4] or future is None
+                    outcomes.append('coalesced')
+                    return True
+                if maxsize and len(tasks) >= maxsize:
+                    oldest = tasks.popleft()
+                    pending.pop(oldest[2], None)
+                    for oldest_future in oldest[3]:
+                        oldest_future.cancel()
+                    outcomes.append('dropped')
+
+            elif maxsize and len(tasks) >= maxsize:
+                if policy == DROP:
+                    outcomes.append('dropped')
+                    return False
+                condition.wait_for(lambda: len(tasks) < maxsize or state['stopping'])
+                if state['stopping']:
+                    outcomes.append('dropped')
+                    return False
+
+            task = [work_args, work_kwargs, task_key, [future] if future is not None else [], future is None, time.monotonic()]
+            if task_key is not None:
+                pending[task_key] = task
+            tasks.append(task)
+            outcomes.append('queued')
+            condition.notify()
+            return True
+
+    def put_item(*work_args, **work_kwargs):
+        return _queue_task(work_args, work_kwargs)
+
+    def submit(*work_args, **work_kwargs):
+        future = Future()
+        if not _queue_task(work_args, work_kwargs, future):
+            future.cancel()
+        return future
 
     def get_item():
         try:
-            item = product_queue.get_nowait()
-            product_queue.task_done()
+            item = done_queue.get_nowait()
+            done_queue.task_done()
         except queue.Empty:
             item = None
 
         return item
-    
-    def get_items():
-        try:
-            while True:
-                item = product_queue.get_nowait()
-                product_queue.task_done()
-                yield item
 
+    def next_task():
+        with condition:
+            condition.wait_for(lambda: tasks)
+            task = tasks.popleft()
+            if task is not _STOP and task[2] is not None:
+                pending.pop(task[2], None)
+            if maxsize and policy == BLOCK:
+                # room for a blocked put
+                condition.notify_all()
+            return task
+
+    def workloop():
+        while True:
+            task = next_task()
+            if task is _STOP:
+                break
+            work_args, work_kwargs, _, futures, collect, queued = task
+            # cancelled futures are left out, the task is skipped when nobody waits
+            futures = [f for f in futures if f.set_running_or_notify_cancel()]
+            if not futures and not collect:
+                metrics.cancelled()
+                continue
+            started = metrics.started(time.monotonic() - queued)
+            try:
+                result = workerfunc(*work_args, **work_kwargs)
+            except Exception as x:
+                metrics.finished(started, failed=True)
+                for future in futures:
+                    future.set_exception(x)
+                if collect or not futures:
+                    syslog.exception("Exception: %s", x, exc_info=True, stack_info=True)
+                continue
+
+            metrics.finished(started)
+            for future in futures:
+                future.set_result(result)
+            if collect and result is not None:
+                done_queue.put_nowait(result)
+
+        syslog.debug('Ending thread for %s\n', name)
+
+    threads = [threading.Thread(target=workloop, name=f"{name}-{n}", daemon=True) for n in range(workers)]
+
+    def start():
+        for thread in threads:
+            thread.start()
+
+    def stop():
+        syslog.debug('Sending stop to threads for %s\n', name)
+        with condition:
+            if not state['stopping']:
+                state['stopping'] = True
+                # sentinels go after the waiting tasks, regardless of maxsize
+                tasks.extend([_STOP] * workers)
+                condition.notify_all()
+
+    def join():
+        for thread in threads:
+            thread.join()
+
+    return workerfactory(
+        start=start,
+        stop=stop,
+        put=put_item,
+        submit=submit,
+        get_return=get_item,
+        waiting=waiting,
+        metrics=metrics,
+        join=join)
+
+_END = object()         # sentinel marking the end of a producer's iterable
+
+def create_producer_from_iterable(iterable, prefetch=1024, batchsize=128, **put_kwargs):
+    """Create a producer thread encapsulating an iterable, items are handed
+    out in batches of up to batchsize items. The thread reads ahead at most
+    prefetch items, a batch is handed over as soon as it is full or when
+    the consumer has nothing left to take.
+
+    iterable: the iterable to read in the thread
+    prefetch: the number of items to read ahead
+    batchsize: the maximum number of items in a batch
+
+    returns an object with the following members:
+        start() starts the thread
+        get_batch(timeout=None) list of the next items, waits at most
+            timeout seconds for them, [] on a timeout and None once
+            the iterable has ended
+        batches(timeout=None) iterable for the batches until the end
+        get_item() next item without waiting, or None
+        get_items() iterable for the items available without waiting
+        finished() True once the consumer reached the end
+        error() exception that ended the iterable, or None
+        stop() stops reading, the consumer gets the end after the
+            batches already read
+        join() waits for the thread to end"""
+
+    class workerfactory(dict):
+        def __getattr__(self, key):
+            return self[key]
+
+    stop_event = threading.Event()
+    product_queue = queue.Queue()
+    # bounds the batches read ahead, the end marker never waits for room
+    room = threading.Semaphore(max(1, prefetch // max(1, batchsize)))
+    current = deque()
+    state = dict(ended=False, error=None)
+
+    def _take(timeout):
+        # moves the next batch into current, False when there is none
+        if state['ended']:
+            return False
+        try:
+            batch = product_queue.get(timeout=timeout) if timeout is None or timeout > 0 else product_queue.get_nowait()
         except queue.Empty:
-            pass
-    
+            return False
+        product_queue.task_done()
+        if batch is _END:
+            state['ended'] = True
+            return False
+        room.release()
+        current.extend(batch)
+        return True
+
+    def get_batch(timeout=None):
+        if not current and not _take(timeout):
+            return None if state['ended'] else []
+        batch = list(current)
+        current.clear()
+        return batch
+
+    def batches(timeout=None):
+        while True:
+            batch = get_batch(timeout)
+            if batch is None:
+                return
+            if batch:
+                yield batch
+
+    def get_item():
+        if not current and not _take(0):
+            return None
+        return current.popleft()
+
+    def get_items():
+        while current or _take(0):
+            yield current.popleft()
+
     def stop():
         nonlocal stop_event
         syslog.debug('Sending stop to thread for %s\n', str(iterable))
         stop_event.set()
 
-    def workloop():
-        nonlocal product_queue, stop_event
-        sleepfor = 0.05
-        sleepmax = 0.5
+    def _hand_over(batch):
+        # waits for room, checking now and then whether to stop
+        while not room.acquire(timeout=0.1):
+            if stop_event.is_set():
+                return False
+        product_queue.put(batch)
+        return True
 
+    def workloop():
+        batch = []
         try:
-
             for item in iterable:
                 if stop_event.is_set():
                     break
 
-                item_done = False
-                while not item_done:
-                    if stop_event.is_set():
+                batch.append(item)
+                # hand over full batches, or right away when the consumer ran dry
+                if len(batch) >= batchsize or product_queue.empty():
+                    if not _hand_over(batch):
+                        batch = []
                         break
+                    batch = []
 
-                    try:
-                        product_queue.put_nowait(item)
-                        item_done = True
-
-                    except queue.Full:
-                        time.sleep(sleepfor)
-                        sleepfor = min(sleepfor * 1.2, sleepmax)
+            if batch:
+                _hand_over(batch)
 
             syslog.debug('Iterable ended %s\n', str(iterable))
 
         except Exception as x:
+            state['error'] = x
             syslog.exception("Exception: %s", x, exc_info=True, stack_info=True)
+            # the items read before the exception still go out before the end
+            if batch:
+                _hand_over(batch)
+
+        finally:
+            product_queue.put(_END)
 
         syslog.debug('Ending thread for %s\n', str(iterable))
 
-    task_processor = threading.Thread(target=workloop)
+    task_processor = threading.Thread(target=workloop, daemon=True)
 
     return workerfactory(
         processor=task_processor,
         start=task_processor.start,
         stop=stop,
+        get_batch=get_batch,
+        batches=batches,
         get_item=get_item,
-        get_items = get_items,
+        get_items=get_items,
+        finished=lambda: state['ended'] and not current,
+        error=lambda: state['error'],
         join=task_processor.join)
@@ -3,14 +3,31 @@
 #pylint: disable=invalid-name
 
 import datetime
+from functools import lru_cache
 import pytz
 from dateutil import parser
+import numpy as np
 from numpy import datetime64, timedelta64
 
+@lru_cache(4096)
+def parse_timestamp(d):
+    '''Parses journal style YYYY-MM-DDTHH:MM:SSZ timestamps directly,
+    other shapes go through dateutil. Results are cached, journal events
+    tend to share the same second.'''
+    if len(d) == 20 and d[19] == 'Z' and d[10] == 'T' and d[4] == '-' and d[13] == ':':
+        try:
+            return datetime.datetime(
+                int(d[0:4]), int(d[5:7]), int(d[8:10]),
+                int(d[11:13]), int(d[14:16]), int(d[17:19]),
+                tzinfo=datetime.timezone.utc)
+        except ValueError:
+            pass
+    return parser.parse(d)
+
 def make_datetime(d):
     # use parser to convert from string representation
     if isinstance(d, str):
-        return parser.parse(d)
+        return parse_timestamp(d)
     # ints and floats are asumed to be unix timestamps (seconds sinds 1/1/1970)
     elif isinstance(d, int):
         return datetime.datetime.fromtimestamp(d)
@@ -63,4 +80,22 @@ def dt64(some_time, time_resolution="s"):
     """Convert unix epoch timestamp to numpy datetime64"""
     return datetime64(int(round(make_datetime(some_time).timestamp())), time_resolution)
 
+def dt64_array(timestamps, time_resolution="s"):
+    """Convert a column of journal timestamps to a numpy datetime64 array (UTC)"""
+    stamps = np.char.rstrip(np.asarray(timestamps, dtype=str), 'Z')
+    try:
+        return stamps.astype(f"datetime64[{time_resolution}]")
+    except ValueError:
+        # not all journal shaped, convert one by one
+        return np.asarray([
+            datetime64(int(round(make_datetime(t).timestamp())), 's')
+            for t in timestamps
+        ]).astype(f"datetime64[{time_resolution}]")
+
+def unix_time_array(timestamps):
+    """Convert a column of journal timestamps to unix (epoch) seconds"""
+    return (
+        dt64_array(timestamps, "ms") - datetime64('1970-01-01T00:00:00', 'ms')
+    ) / timedelta64(1, 's')
+
 
@@ -4,8 +4,7 @@ import sys
 import os
 import time
 import json
-import statistics
-from functools import reduce
+from functools import reduce, lru_cache
 import numpy as np
 import pandas as pd
 import requests
@@ -17,33 +16,69 @@ from playsound import playsound as original_play_sound
 from edcompanion import init_console_logging
 from edcompanion import navroute, events
 from edcompanion.events import edc_track_journal, edc_list_journals, edc_read_journal
+from edcompanion.events import edc_tail_journal, edc_follow_journals, create_journal_watcher, json_loads
 from edcompanion.timetools import make_datetime, make_naive_utc
-from edcompanion.edsm_api import get_edsm_info, distance_between_systems, post_journal_item, get_edsm_system_risk, get_commander_position, get_systems_in_cube
+from edcompanion.edsm_api import edsm_discard, get_edsm_info, distance_between_systems, post_journal_item, get_edsm_system_risk, get_commander_position, get_systems_in_cube
 from edcompanion.calctools import *
-from edcompanion.threadworker import create_threaded_worker
+from edcompanion.threadworker import create_worker_pool, DROP, COALESCE
+from edcompanion.metrics import create_metrics_logger, create_metrics_server, metrics_report
+from edcompanion.checkpoint import load_checkpoint, create_checkpointer
+from edcompanion.dispatch import create_event_dispatcher, DONE, STOP
+from edcompanion.guardian import is_guardian_event, is_guardian_signal
+from edcompanion.systemstore import create_system_store, import_sector_files
+from edcompanion.persistence import create_document_writer
+from edcompanion.missionroute import best_visiting_order
+from edcompanion.poi import create_poi_search
+from edcompanion.enrich import create_enricher
+from edcompanion.telemetry import create_session_telemetry
+from edcompanion.dashboard import create_console, create_quiet_display, create_dashboard
 
 syslog = init_console_logging(__name__)
 edlogspath = os.path.join(os.getenv('HOME', os.getenv('USERPROFILE')), 'Saved Games', 'Frontier Developments', 'Elite Dangerous')
 #"/Users/fenke/Saved Games/Frontier Developments/Elite Dangerous"
 
 import math
-from itertools import permutations
 
 def parse_route_systems(system_name, mission_db):
+    # destinations use the coordinates looked up for their mission
     return { **{
-        system_name:np.asarray([get_edsm_info(system_name, verbose=False).get('coords',{}).get(k) for k in ['x', 'y', 'z']])
+        system_name:np.asarray([get_edsm_info(system_name, verbose=False).get('coords',dict(x=0,y=0,z=0)).get(k) for k in ['x', 'y', 'z']])
     }, **{
-        s.get('DestinationSystem'):np.asarray([get_edsm_info(s.get('DestinationSystem'), verbose=False).get('coords',{}).get(k) for k in ['x', 'y', 'z']])
+        s.get('DestinationSystem'):np.asarray([s.get('coords').get(k) for k in ['x', 'y', 'z']])
         for s in mission_db.values() if s.get('coords',{})
     }}
 
 def calculate_total_jumps(*route_points, jumpdistance=25):
     return sum([1+math.floor(distance_between_systems(*rp)/jumpdistance) for rp in route_points])
 
-def get_mission_routes(start_system, mission_db, jumpdistance):
+@lru_cache(32)
+def best_mission_route(route_systems, route_coords, jumpdistance):
+    order, _ = best_visiting_order(route_coords, jumpdistance)
+    route = [route_systems[i] for i in order]
+    return [(x,y) for x,y in zip(route, route[1:])]
+
+def get_mission_routes(start_system, mission_db, jumpdistance, route_systems=None):
+    route_systems = route_systems if route_systems is not None else parse_route_systems(start_system, mission_db)
+    route_coords = tuple(tuple(float(v) for v in c) for c in route_systems.values())
+    return [best_mission_route(tuple(route_systems), route_coords, jumpdistance)]
+
+def lookup_mission_advice(mission_id, start_system, mission_db, jumpdistance):
+    """Looks up the destination of a mission and the next system to travel to,
+    returns the coordinates and (next system, jumps, mission names) or None.
+    Runs on the enricher's threads, mission_db is a copy the caller made."""
+    coords = []
+    if mission_id is not None:
+        coords = get_edsm_info(mission_db.get(mission_id, {}).get('DestinationSystem'), verbose=False).get('coords',[])
+        if mission_id in mission_db:
+            mission_db[mission_id]['coords'] = coords
+
     route_systems = parse_route_systems(start_system, mission_db)
-    all_routes = [r for r in permutations(route_systems) if r[0] == start_system]
-    return sorted([[(x,y) for x,y in zip(r, r[1:])] for r in all_routes], key=lambda R:calculate_total_jumps(*R, jumpdistance=jumpdistance))
+    best_route = get_mission_routes(start_system, mission_db, jumpdistance=jumpdistance, route_systems=route_systems)[0]
+    if not best_route:
+        return coords, None
+    s1, s2 = best_route[0]
+    mnames = ', '.join(set([m.get('LocalisedName', '') for i,m in mission_db.items() if s2==m.get('DestinationSystem') ]))
+    return coords, (s2, 1+math.floor(np.linalg.norm(route_systems[s1] - route_systems[s2])/jumpdistance), mnames)
 
 
 planet_values = {
@@ -95,32 +130,8 @@ planet_values = {
 
 def init_poi_search():
     syslog.debug(f"Reading Points-Of-Interest from EDAstro ...")
-
-    req = requests.get('https://edastro.com/gec/json/all')
-
-    edastro_poi = {
-        item.get('galMapSearch'):{
-            c:item.get(k)
-            for c,k in zip(['coordinates','name','region','type','summary'], ['coordinates','name','region','type','summary'])
-        }
-        for item in  req.json()
-    }
-    poi_systems = np.asarray([
-        i.get('coordinates')
-        for k, i in edastro_poi.items() ])
-    poi_systemnames = np.asarray([
-        (k, i.get('name'),  i.get('summary'))
-        for k, i in edastro_poi.items() ])
-
-    def find_nearest_poi(coord1, coord2=None):
-        p1 = np.asarray(coord1)
-        p2 = np.asarray(coord2) if coord2 is not None else coord1
-
-        poi_distances = np.linalg.norm(poi_systems[:, [0,1,2]] - p1, axis=1) + np.linalg.norm(poi_systems[:, [0,1,2]] - p2, axis=1)
-        ordering = poi_distances.argsort()
-        return poi_systems[ordering][0], poi_systemnames[ordering][0]
-
-    return edastro_poi, find_nearest_poi
+    poi_search = create_poi_search()
+    return poi_search.pois, poi_search.find_nearest_poi
 
 rankings = dict(
     Progress = dict(),
@@ -135,10 +146,10 @@ completed = {}
 signals = {}
 bodysignals = {}
 saascan = {}
-fuel_used = []
 
-sound_queue = create_threaded_worker(original_play_sound)
-prefetch_queue = create_threaded_worker(get_edsm_info)
+# a late sound is of no use, repeated lookups of a system only need doing once
+sound_queue = create_worker_pool(original_play_sound, maxsize=4, policy=DROP, name='sound')
+prefetch_queue = create_worker_pool(get_edsm_info, workers=2, maxsize=64, policy=COALESCE, name='prefetch')
 
 
 #bigtasks_queue = create_threaded_worker(lambda F, *args, **kwargs: F(*arg, **kwargs))
@@ -177,10 +188,8 @@ except:
     pass
 
 def line_distances(point):
-    return {
-        l:distance_point_to_line(point, s.direction, s.support)
-        for l,s in glines.items()
-    }
+    found = points_to_lines([point], glines)
+    return dict(zip(found.names, found.distances[0]))
 
 def distance_0(point):
     return round(np.linalg.norm(np.cross(glines['line_0']['direction'], np.asarray(point)-glines['line_0']['support']))/np.linalg.norm(glines['line_0']['direction']),2)
@@ -198,55 +207,55 @@ def nearest_point_on_0(point):
     return np.dot(np.asarray(point)-glines['line_0']['support'], glines['line_0']['direction'] ) + glines['line_0']['support']
 
 
-current_sector = ''
-sector = {}
-sectors = {}
-
-def load_sector(system_name):
-    global current_sector, sector, sectors
-    sector_name = system_name.split(' ')[0]
-    sector_filename = os.path.join(os.getcwd(), 'data', 'sectors', sector_name + '.json')
-
-    if current_sector != sector_filename:
-        if sector:
-            with open(current_sector, 'wt') as jsonfile:
-                json.dump(sector, jsonfile, indent=3)
-
-        current_sector = sector_filename
-
-        if os.path.exists(sector_filename):
-            with open(sector_filename, 'rt') as jsonfile:
-                sector = json.load(jsonfile)
-        else:
-            sector = {}
-
-        sectors[sector_name] = sector
-
-    return sector
-
-def get_sector_info(system_name):
-    s = load_sector(system_name)
-    return s.get(system_name, {})
+def follow_journal(backlog=0, verbose=False, resume=True, handlers=None, deadline=None, display=None,
+                   metrics_interval=300, metrics_port=None):
+    """Follows the journals, with a deadline in seconds EDSM lookups run
+    in the background and results arriving later are shown as follow-up lines.
 
+    display is 'console' (default), 'dashboard' for the curses dashboard,
+    'quiet' to skip all output, or a display object, see edcompanion.dashboard.
+    Replaying a backlog on the dashboard skips the output.
 
-def follow_journal(backlog=0, verbose=False):
-    global current_sector, sector, sectors
-
+    The worker metrics are logged every metrics_interval seconds, and
+    served over HTTP on localhost when metrics_port is given."""
     sound_queue.start()
+    prefetch_queue.start()
+    metrics_logger = create_metrics_logger(metrics_interval)
+    metrics_logger.start()
+    metrics_server = create_metrics_server(metrics_port) if metrics_port else None
+    if metrics_server:
+        metrics_server.start()
+    enricher = create_enricher(deadline)
+    header = ''
+
+    if display == 'dashboard' and backlog:
+        display = 'quiet'
+    own_display = display in (None, 'console', 'quiet', 'dashboard')
+    if own_display:
+        display = {
+            'quiet':create_quiet_display,
+            'dashboard':create_dashboard,
+        }.get(display, create_console)()
+    display.start()
+    write = display.write
+
+    def follow_up(text):
+        write(f"\r{'':20} {'':>7} | {'':21} | {text}\n{header}")
+
     def playsound(*args, **kwargs):
         if verbose:
             sound_queue.put(*args, **kwargs)
 
     starpos = np.asarray([0,0,0])
     guardian_system = False
-    navi_route = {item.get('StarSystem'):item for item in navroute.edc_navigationroute(edlogspath)}
+    navi_route = dict(navroute.navigationroute_systems(edlogspath))
 
     guardian_systems = {}
     try:
         with open('guardian_systems.json', "rt") as jsonfile:
             guardian_systems=json.load(jsonfile)
     except Exception as x:
-        sys.stdout.write(f"Error {x}\n")
+        write(f"Error {x}\n")
 
 
     missions = {}
@@ -254,43 +263,50 @@ def follow_journal(backlog=0, verbose=False):
         with open('missions.json', "rt") as jsonfile:
             missions=json.load(jsonfile)
     except Exception as x:
-        sys.stdout.write(f"Error {x}\n")
+        write(f"Error {x}\n")
 
     completed = {}
     try:
         with open('completed.json', "rt") as jsonfile:
             completed=json.load(jsonfile)
     except Exception as x:
-        sys.stdout.write(f"Error {x}\n")
+        write(f"Error {x}\n")
 
     bodysignals = {}
     try:
         with open('bodysignals.json', "rt") as jsonfile:
             bodysignals=json.load(jsonfile)
     except Exception as x:
-        sys.stdout.write(f"Error {x}\n")
+        write(f"Error {x}\n")
 
     signals = {}
     try:
         with open('signals.json', "rt") as jsonfile:
             signals=json.load(jsonfile)
     except Exception as x:
-        sys.stdout.write(f"Error {x}\n")
+        write(f"Error {x}\n")
+
+    all_ships = {}
+    try:
+        with open('ships.json', "rt") as jsonfile:
+            all_ships=json.load(jsonfile)
+    except Exception as x:
+        pass
 
     #systems = {}
     # try:
     #     with open('systems.json', "rt") as jsonfile:
     #         systems=json.load(jsonfile)
     # except Exception as x:
-    #     sys.stdout.write(f"Error {x}\n")
+    #     write(f"Error {x}\n")
 
     eventdump = {}
     signaldump ={}
 
-    jumptimes = []
     system_name = ''
+    system = {}
     system_factions = []
-    fuel_level = []
+    telemetry = create_session_telemetry()
     fuel_capacity = 1
     entrytime = 0
     body_id = 0
@@ -298,18 +314,526 @@ def follow_journal(backlog=0, verbose=False):
     mission_advice = ""
     edastro_poi, find_nearest_poi = init_poi_search()
 
+    new_store = not os.path.exists(os.path.join('data', 'systems.sqlite'))
+    system_store = create_system_store(os.path.join('data', 'systems.sqlite'))
+    if new_store:
+        import_sector_files(system_store, os.path.join('data', 'sectors'))
+
 
     kb_stop = False
     last_journal = ''
 
     logfiles = edc_list_journals(edlogspath)
     logfiles = logfiles[-(1+min(backlog, len(logfiles)-1)):]
+
+    # Resuming: continue after the last checkpointed event, with the state as it was then
+    cursor, resume_state = load_checkpoint() if resume and backlog == 0 else ({}, {})
+    resume_offsets = {}
+    if resume_state:
+        all_journals = [ntpath.basename(f) for f in edc_list_journals(edlogspath)]
+        if cursor.get('journal') in all_journals:
+            logfiles = edc_list_journals(edlogspath)[all_journals.index(cursor.get('journal')):]
+            resume_offsets[cursor.get('journal')] = cursor.get('offset', 0)
+
+        missions = {int(k):v for k,v in resume_state.get('missions', {}).items()}
+        completed.update(resume_state.get('completed', {}))
+        saascan.update(resume_state.get('saascan', {}))
+        navi_route = resume_state.get('navi_route', navi_route)
+        telemetry.restore(resume_state.get('telemetry', {}))
+        fuel_capacity = resume_state.get('fuel_capacity', fuel_capacity)
+        entrytime = telemetry.last_entry(entrytime)
+        system_name = resume_state.get('system_name', '')
+        starpos = np.asarray(resume_state.get('starpos', [0,0,0]))
+        body_id = resume_state.get('body_id', body_id)
+        jumpdistance = resume_state.get('jumpdistance', jumpdistance)
+        mission_advice = resume_state.get('mission_advice', '')
+        guardian_system = resume_state.get('guardian_system', False)
+        if system_name:
+            system = system_store.get_system(system_name) or system_store.create_system(system_name, starpos.tolist(), None)
+        syslog.info(f"Resuming {cursor.get('journal')} at {cursor.get('offset')} in {system_name}")
+
+    def snapshot():
+        return dict(
+            missions=missions,
+            completed=completed,
+            saascan=saascan,
+            navi_route=navi_route,
+            telemetry=telemetry.snapshot(),
+            fuel_capacity=fuel_capacity,
+            system_name=system_name,
+            starpos=np.asarray(starpos).tolist(),
+            body_id=body_id,
+            jumpdistance=jumpdistance,
+            mission_advice=mission_advice,
+            guardian_system=guardian_system,
+            software_info=edsm_params.get('software_info', {}),
+        )
+
+    # Dashboard panes, read on the drawing thread holding the enricher lock,
+    # which the event loop holds around each event
+    def system_pane():
+        return [
+            system_name,
+            f"{len(system.get('bodies', {}))} bodies, stars {'/'.join([system.get('bodies', {}).get(i, {}).get('StarType', '') for i in system.get('stars', [])])}",
+            system_factions[0] if system_factions else '',
+            'Guardian system' if guardian_system else '',
+            edastro_poi.get(system_name, {}).get('name', '') or '',
+        ]
+
+    def fuel_pane():
+        return [
+            f"Fuel {round(100*telemetry.fuel_level(0) / fuel_capacity,1)}% -> {round(telemetry.estimated_jumps(),1) if telemetry.fuel_level() is not None else '-'} jumps",
+            f"Per jump {round(telemetry.fuel_per_jump.mean(0),2)} t, {round(telemetry.seconds_per_jump.mean(0))} s",
+            f"Scooping {round(telemetry.scoop_rate.ewma(0),2)} t/s",
+            f"Jump range {jumpdistance} ly",
+        ]
+
+    def route_pane():
+        return [f"{len(navi_route)} systems in route", mission_advice and f"Mission: {mission_advice}"] + [
+            f"{name:28} {item.get('StarClass','')}" for name, item in list(navi_route.items())[:8]
+        ]
+
+    def missions_pane():
+        return [f"{m.get('LocalisedName', '')} -> {m.get('DestinationSystem', '')}" for m in list(missions.values())]
+
+    for pane, source in [('system', system_pane), ('fuel', fuel_pane), ('route', route_pane), ('missions', missions_pane)]:
+        display.show(pane, source, enricher.lock)
+
+    # Documents kept on disk by a background writer, handlers only touch them,
+    # the writer serializes them holding the enricher lock like the dashboard
+    document_writer = create_document_writer(lock=enricher.lock)
+    for filename, document in [
+        ('missions.json', missions), ('completed.json', completed),
+        ('bodysignals.json', bodysignals), ('signals.json', signals),
+        ('saascan.json', saascan), ('eventdump.json', eventdump),
+        ('signaldump.json', signaldump), ('guardian_systems.json', guardian_systems),
+        ('ships.json', all_ships)]:
+        document_writer.register(filename, document)
+    document_writer.start()
+    checkpoint = create_checkpointer(snapshot, writer=document_writer) if backlog == 0 else None
+    processed = dict(cursor)
     syslog.info(f"Reading {len(logfiles)} journals")
 
     send_queue = None
 
+    # Event handlers, state updates run before the console header is written
+    state_handlers = create_event_dispatcher('state')
+    event_handlers = create_event_dispatcher('event')
+
+    @state_handlers.register('Location', 'FSDJump')
+    def on_location(eventname, event, timestamp):
+        nonlocal system_name, system, body_id, guardian_system
+        # set current star system
+        system_name = event.get('StarSystem')
+        if system_name in navi_route:
+            navi_route.pop(system_name)
+
+        system = system_store.get_system(system_name)
+        if system is None:
+            body_id = str(event.get('BodyID',0))
+            system = system_store.create_system(
+                system_name, event.get('StarPos',[]), timestamp.isoformat(),
+                address=event.get('SystemAddress'),
+                bodies={body_id:dict(Body=event.get('Body'), BodyType=event.get('BodyType'))})
+        system_store.commit()
+
+        guardian_system = bool(event.get('SystemAllegiance', "").lower() == 'guardian')
+        if guardian_system:
+            guardian_systems.update({
+                system_name: system.get('StarPos',[])
+            })
+            document_writer.touch('guardian_systems.json')
+
+    @event_handlers.register('KeyboardInterrupt')
+    def on_keyboard_interrupt(eventname, event, timestamp, header):
+        nonlocal kb_stop
+        write(f"Keyboard Interrupt {event.get('filename')}\n")
+        kb_stop = True
+        return STOP
+
+    @event_handlers.register('JournalFinished')
+    def on_journal_finished(eventname, event, timestamp, header):
+        write(f"Journal read {event.get('filename')}\n")
+        return STOP
+
+    @event_handlers.register('Fileheader')
+    def on_fileheader(eventname, event, timestamp, header):
+        write(f"{'Odyssey' if event.get('Odyssey', False) else 'Horizons' }\n{header}")
+        edsm_params['software_info'].update(dict(
+            fromGameVersion=event.get("gameversion"),
+            fromGameBuild=event.get("build"),
+        ))
+
+    @event_handlers.register('FSDJump')
+    def on_fsdjump(eventname, event, timestamp, header):
+        nonlocal entrytime, body_id, guardian_system, system_factions
+        entrytime=timestamp.timestamp()
+        body_id = str(event.get('BodyID'))
+        system["BodyID"] = body_id
+        system_store.upsert_system(system_name, system)
+        #system['stars'] = list(set(system.get('stars',[])).add(body_id))
+        d1 = distance_1(event.get('StarPos'))
+        if d1 < 2000:
+            write(f"Distance to Line 1: {d1:8}")
+
+
+        if system_name in navi_route:
+            navi_system = navi_route.pop(system_name)
+        else:
+            navi_system = {}
+
+        telemetry.jump(entrytime, event.get('FuelUsed'), event.get('FuelLevel'))
+
+        # handle mission updates
+        if mission_advice and mission_advice not in navroute.navigationroute_systems(edlogspath):
+            mnames = ', '.join(set([m.get('LocalisedName', '') for i,m in missions.items() if mission_advice==m.get('DestinationSystem') ]))
+            write(f"Travel to {mission_advice} for \"{mnames}\"\n{header}")
+
+        # "SystemAllegiance":"Guardian"
+
+        guardian_system = bool(event.get('SystemAllegiance', "") == 'Guardian')
+        if guardian_system:
+            write(f"Guardian System\n{header}")
+            display.alert(f"Guardian System {system_name}")
+            playsound('./sound88.wav')
+
+        system_factions = [f.get('Name','') for f in sorted(event.get('Factions',[{}]),key=lambda X: -X.get('Influence',0))]
+        if len(system_factions) > 1:
+            write(f"Faction: {system_factions[0]:32}")
+
+        # Points of interest
+        if system_name in edastro_poi:
+            write(f"Poi: {edastro_poi[system_name].get('name')}\n{edastro_poi[system_name].get('type'):20} | {edastro_poi[system_name].get('summary')}\n{header}")
+        else:
+            write(f"\n{header}")
+
+        return DONE
+
+    @event_handlers.register_match(lambda name: 'NavRoute' in name)
+    def on_navroute(eventname, event, timestamp, header):
+        nonlocal navi_route
+        navi_route = dict(navroute.navigationroute_systems(edlogspath))
+        if system_name in navi_route:
+            navi_system = navi_route.pop(system_name)
+        else:
+            navi_system = {}
+
+        #navi_distances = {s:np.sqrt(np.sum(np.square(np.asarray(i.get('StarPos'))-starpos))) for s, i in navi_route.items()}
+
+        names, directions, supports = line_arrays({'line_1':glines['line_1']})
+        navi_points = np.asarray([i.get('StarPos') for i in navi_route.values()], dtype=float).reshape(-1, 3)
+        navi_distances_l1 = dict(zip(navi_route, np.round(distances_to_lines(navi_points, directions, supports)[:, 0], 2)))
+
+        if len(navi_distances_l1) > 0:
+            min_d1, max_d1 = min(navi_distances_l1.values()), max(navi_distances_l1.values())
+            if min_d1 < 2000:
+                if len(navi_distances_l1) > 5:
+                    write(f"Distances to L1 between {min_d1} and {max_d1} \n{header}")
+                elif min_d1 > 30:
+                    min_d1_entry = list(filter(lambda k: not navi_distances_l1[k] > min_d1, navi_distances_l1.keys()))[0]
+                    nearest_point = nearest_point_on_1(navi_route.get(min_d1_entry,{}).get('StarPos'))
+                    def show_aim(tsg1, late):
+                        text = f"Try aiming at {tsg1[0].get('name')}" if tsg1 else f"Try aiming at {np.round(nearest_point,1)}"
+                        if late:
+                            follow_up(text)
+                        else:
+                            write(f"{text} \n{header}")
+
+                    enricher.enrich(show_aim, get_systems_in_cube, list(nearest_point), 100)
+
+                else:
+                    write(f"Distances to L1: {' / '.join([str(v) for v in navi_distances_l1.values()])} \n{header}")
+
+    @event_handlers.register('LoadGame')
+    def on_loadgame(eventname, event, timestamp, header):
+        nonlocal entrytime, fuel_capacity
+        entrytime=timestamp.timestamp()
+        telemetry.entry(entrytime, event.get('FuelLevel'))
+        fuel_capacity = max(event.get('FuelCapacity',1),1)
+        #write(f"\n")
+
+    @event_handlers.register('StartJump')
+    def on_startjump(eventname, event, timestamp, header):
+        if event.get("JumpType") != "Hyperspace":
+            return
+
+        prefetch_queue.put(str(event.get('StarSystem','')))
+        if system_name in navi_route:
+            navi_route.pop(system_name)
+        write(f"{event.get('StarSystem',''):25} | class {event.get('StarClass','')}\n{header}") # FuelCapacity
+
+    @event_handlers.register('FSDTarget')
+    def on_fsdtarget(eventname, event, timestamp, header):
+        prefetch_queue.put(str(event.get('Name','')))
+        write(
+            f"{event.get('Name',''):25} | class {event.get('StarClass','')}"
+        )
+        if system_store.has_system(event.get('Name','')):
+            write(f" (been there)")
+
+        def show_risk(risk, late):
+            if risk > 1:
+                display.alert(f"{event.get('Name','')} High Risk {round(risk,2)}")
+                if late:
+                    follow_up(f"{event.get('Name',''):25} -> High Risk {round(risk,2)}")
+                else:
+                    write(f"-> High Risk {round(risk,2)}")
+
+        enricher.enrich(show_risk, get_edsm_system_risk, event.get('Name',''))
+
+        # Fuel management assistance
+        navi_fuel = {s:np.sqrt(np.sum(np.square(np.asarray(i.get('StarPos'))-starpos))) for s, i in navi_route.items() if i.get('StarClass') in 'KGBFOAM'}
+        if navi_fuel:
+            fuel_system = reduce(
+                lambda total, item:item if navi_fuel[item] < navi_fuel[total] else total,
+                list(navi_fuel)
+            )
+            fuel_ratio = round(100*telemetry.fuel_level() / fuel_capacity,1)
+            est_jumps = round(telemetry.estimated_jumps(),1)
+            write(f", fuel {fuel_ratio}% -> {est_jumps} jumps, fuel at {round(navi_fuel[fuel_system],1)} ly\n{header}")
+            if est_jumps < 3:
+                display.alert(f"Fuel {fuel_ratio}% -> {est_jumps} jumps")
+                playsound('./sound88.wav')
+        else:
+             write(f", {event.get('RemainingJumpsInRoute','')} jumps remaining\n{header}")
+
+    @event_handlers.register('FuelScoop')
+    def on_fuelscoop(eventname, event, timestamp, header):
+        telemetry.fuel(event.get('Total'), timestamp.timestamp())
+        fuel_ratio = round(100*event.get('Total') / fuel_capacity,1)
+        est_jumps = round(telemetry.estimated_jumps(),1)
+        write(f"{fuel_ratio:3}% -> {est_jumps} jumps \n{header}") # FuelCapacity
+
+    @event_handlers.register('FSSDiscoveryScan')
+    def on_fssdiscoveryscan(eventname, event, timestamp, header):
+        if eventname not in system:
+            system[eventname] = {}
+        system[eventname].update({k:event.get(k) for k in ['BodyCount','NonBodyCount','Progress']})
+        system_store.upsert_discovery(system_name, eventname, system[eventname])
+
+        write(f"Discovery {', '.join([str(k) + ': ' + str(v) for k,v in system[eventname].items() ])} \n{header}")
+
+    @event_handlers.register('Scan')
+    def on_scan(eventname, event, timestamp, header):
+        scan_body_id = str(event.get('BodyID'))
+        if scan_body_id not in system["bodies"]:
+            system["bodies"].update({scan_body_id:event})
+        else:
+            system["bodies"][scan_body_id].update(event)
+        system_store.upsert_body(system_name, scan_body_id, system["bodies"][scan_body_id], scan_body_id in system["stars"])
+
+        if scan_body_id == body_id:
+            write(f"Class {event.get('StarType')}{event.get('Subclass')} ")
+            if not event.get('WasDiscovered', True):
+                write(f" \t{'Undiscovered'} \n{header}")
+                playsound('./sound88.wav')
+
+        elif event.get('StarType'):
+            if scan_body_id not in system["stars"]:
+                system["stars"].update({scan_body_id:system["bodies"][scan_body_id]})
+                system_store.upsert_body(system_name, scan_body_id, system["bodies"][scan_body_id], True)
+            if event.get('StarType') not in 'KGBFOAM' and not event.get("WasDiscovered", True):
+                write(f"{event.get('BodyName')}, class {event.get('StarType')}-{event.get('Subclass')}, solar-mass: {round(event.get('StellarMass'),1)} \n{header}")
+            elif len(system['stars'])>1:
+                write(f"Stars: {'/'.join([system['bodies'].get(i,{}).get('StarType','')  for i in system['stars']])}\n{header}")
+
+        elif not event.get("WasDiscovered", True):
+            if event.get('TerraformState') == 'Terraformable' or planet_values.get(
+                event.get("WasDiscovered"),{}).get(
+                event.get("WasMapped"),{}).get(
+                bool(event.get('TerraformState') == 'Terraformable'),{}).get(
+                event.get("PlanetClass"),0) > 0:
+
+                saas = saascan.get(system_name,{}).get(event.get('BodyName'),{})
+                write(f"{event.get('BodyName').replace(system_name,'').strip()} {event.get('PlanetClass')} {event.get('TerraformState')} ")
+                if saas:
+                    write(f"{saas.get('ProbesUsed')}/{saas.get('EfficiencyTarget')} probes ")
+                else:
+                    playsound('./sound88.wav')
+
+                write(f'\n{header}')
+
+    @event_handlers.register('FSSBodySignals')
+    def on_fssbodysignals(eventname, event, timestamp, header):
+        if system_name not in bodysignals:
+            bodysignals[system_name] = []
+        bodysignals[system_name].append(event)
+        document_writer.touch('bodysignals.json')
+
+    @event_handlers.register('SAASignalsFound')
+    def on_saasignalsfound(eventname, event, timestamp, header):
+        nonlocal guardian_system
+        if 'guardian' in [S.get('Type_Localised').lower() for S in event.get('Signals',[]) if S.get('Type_Localised')]:
+            guardian_system = True
+            guardian_systems.update({
+                system_name: system.get('StarPos',[])
+            })
+            document_writer.touch('guardian_systems.json')
+
+            write(f"Guardian Signals: {event.get('BodyName')}, count= {[S.get('Count') for S in event.get('Signals',[]) if S.get('Type_Localised')=='Guardian'][0]}\n{header}")
+            display.alert(f"Guardian Signals {event.get('BodyName')}")
+
+            playsound('sonar-ping.wav')
+
+    @event_handlers.register('FSSSignalDiscovered')
+    def on_fsssignaldiscovered(eventname, event, timestamp, header):
+        signal = event.get("SignalName_Localised", None)
+        if signal:
+            if signal not in signals:
+                signals[signal] = dict()
+            if system_name not in signals[signal]:
+                signals[signal][system_name] = []
+            signals.get(signal).get(system_name).append(event)
+            document_writer.touch('signals.json')
+
+            #.add((system_name,system_factions[0] if system_factions else '-'))
+
+    @event_handlers.register('SAAScanComplete')
+    def on_saascancomplete(eventname, event, timestamp, header):
+        if system_name not in saascan:
+            saascan[system_name] = {}
+        saascan[system_name][event.get('BodyName')] = event
+        document_writer.touch('saascan.json')
+
+    @event_handlers.register_match(lambda name: 'Screenshot' in name)
+    def on_screenshot(eventname, event, timestamp, header):
+        write(f"{event.get('Body')} {event.get('Filename')}\n{header}")
+        return DONE
+
+    @event_handlers.register_match(lambda name: 'Interdict' in name)
+    def on_interdict(eventname, event, timestamp, header):
+        write(f"{event.get('Interdictor', '??'):22}\n{header}")
+        display.alert(f"{eventname} {event.get('Interdictor', '??')}")
+        return DONE
+
+    @event_handlers.register('Music')
+    def on_music(eventname, event, timestamp, header):
+        write(f"{event.get('MusicTrack'):22}")
+        if event.get('MusicTrack') == 'Combat_Unknown':
+            write(f"Uh-oh\n{header}")
+            display.alert(f"Combat in {system_name}")
+            playsound('./sound88.wav')
+        return DONE
+
+    @event_handlers.register_match(lambda name: 'Mission' in name)
+    def on_mission(eventname, event, timestamp, header):
+        nonlocal mission_advice
+        document_writer.touch('missions.json')
+        document_writer.touch('completed.json')
+        if eventname == 'Missions':
+            active_missions = set([M.get('MissionID', 0) for M in event.get('Active',[])])
+            for mid in active_missions:
+                if mid not in missions:
+                    missions[mid] = {}
+
+            for mid in set(missions):
+                if mid not in active_missions:
+                    missions.get(mid).update({
+                        eventname: timestamp.isoformat()
+                    })
+                    completed[mid] = missions.pop(mid)
+            if not missions:
+                mission_advice = ''
+        else:
+            if eventname == 'MissionAbandoned' or  eventname == 'MissionCompleted' :
+                completed[event.get('MissionID')] = missions.pop(event.get('MissionID'))
+                if not missions:
+                    mission_advice = ''
+
+            elif eventname == 'MissionAccepted':
+                missions[event['MissionID']]={
+                    k:event.get(k, '').split('$')[0] for k in ['LocalisedName', 'Expiry', 'DestinationSystem', 'DestinationStation']
+                }
+                write(f"({len(missions)}) {missions[event['MissionID']].get('LocalisedName')} -> {missions[event['MissionID']].get('DestinationSystem')}\n{header}")
+
+            elif eventname == 'MissionRedirected':
+                missions[event['MissionID']].update({
+                    k:event.get('New'+k) for k in ['DestinationSystem', 'DestinationStation']
+                })
+                write(f"({len(missions)}) {missions[event['MissionID']].get('LocalisedName')} -> {missions[event['MissionID']].get('DestinationSystem')}\n{header}")
+
+            missions.get(event['MissionID'], {}).update({
+                eventname: timestamp.isoformat(),
+            })
+
+        mission_id = event.get('MissionID') if eventname != 'Missions' else None
+
+        def show_advice(result, late):
+            nonlocal mission_advice
+            coords, advice = result
+            if mission_id in missions:
+                missions[mission_id]['coords'] = coords
+                document_writer.touch('missions.json')
+            if advice:
+                mission_advice, jumps, mnames = advice
+                text = f"Travel to {mission_advice} ({jumps}) for \"{mnames: <12}\""
+                if late:
+                    follow_up(text)
+                else:
+                    write(f"{text}\n{header}")
+                return DONE
+
+        # the lookup may run on another thread, it gets its own copy of the missions
+        mission_db = {k:dict(m) for k, m in missions.items()}
+        return enricher.enrich(show_advice, lookup_mission_advice, mission_id, system_name, mission_db, jumpdistance)
+        #write(f"({len(missions)}) {missions.get(event['MissionID']).get('LocalisedName')} -> {missions.get(event['MissionID']).get('DestinationSystem')}\n")
+
+    @event_handlers.register('StoredModules')
+    def on_storedmodules(eventname, event, timestamp, header):
+        #write(f"{event.get('StationName',''):22}\n")
+        modules = event.get('Items',[{}]).copy()
+        document_writer.put('modules.json', modules)
+
+        return DONE
+
+    @event_handlers.register('Loadout')
+    def on_loadout(eventname, event, timestamp, header):
+        nonlocal jumpdistance, fuel_capacity
+        ships[event.get('ShipID')] = event.copy()
+        current_ship = ships[event.get('ShipID')]
+        jumpdistance = round(event.get('MaxJumpRange', 10),1)
+        write(f"{event.get('Ship',''):15} {event.get('ShipIdent',''):6} {event.get('MaxJumpRange',''):5,.1F} ly\n{header}")
+        telemetry.fuel(event.get('FuelLevel'))
+        fuel_capacity = max(event.get('FuelCapacity',{}).get('Main',1),1)
+        all_ships[str(event.get('ShipID'))] = current_ship
+        document_writer.touch('ships.json')
+
+        return DONE
+
+    @event_handlers.register('Rank', 'Progress')
+    def on_rank(eventname, event, timestamp, header):
+        rankings[eventname].update(event)
+        return DONE
+
+    @event_handlers.register('Materials')
+    def on_materials(eventname, event, timestamp, header):
+        my_materials = {T:{I.get("Name"):I.get("Count") for I in event.get(T,[])} for T in ['Raw','Encoded','Manufactured']}
+        #my_materials = {I.get("Name_Localised", I.get("Name")):I.get("Count") for I in item.get('Raw',[]) + item.get("Encoded",[])}
+        return DONE
+
+    # extra handlers by event name, '*' runs after the others for every event
+    for eventname, handler in (handlers or {}).items():
+        if eventname == '*':
+            event_handlers.register_match(lambda name: True)(handler)
+        else:
+            event_handlers.register(eventname)(handler)
+
+    # Live mode tails the current journal and rolls over to new ones,
+    # backlog journals are read one after the other
+    journal_watcher = create_journal_watcher(edlogspath) if backlog == 0 else None
+    if journal_watcher:
+        journal_reader = (
+            (logfile, edc_tail_journal(
+                logfile, watcher=journal_watcher, decode=json_loads,
+                offset=resume_offsets.pop(ntpath.basename(logfile), 0), cursor=cursor))
+            for logfile in edc_follow_journals(edlogspath, logfiles, watcher=journal_watcher))
+    else:
+        journal_reader = (
+            (logfile, edc_read_journal(logfile, notail=True, decode=json_loads))
+            for logfile in logfiles)
+
     # --------------------------------------------------------------
-    for logfile in logfiles:
+    for logfile, journal_events in journal_reader:
 
         if kb_stop:
             break
@@ -327,6 +851,8 @@ def follow_journal(backlog=0, verbose=False):
                 "fromSoftwareVersion":"1.0",
             }
         )
+        if resume_state and ntpath.basename(logfile) == cursor.get('journal'):
+            edsm_params['software_info'].update(resume_state.get('software_info', {}))
 
         def send_event_edsm(event):
             nonlocal edsm_last_activity, edsm_params
@@ -341,116 +867,56 @@ def follow_journal(backlog=0, verbose=False):
             if response and response.get('msg') != 'OK':
                 return response
 
-        send_queue = create_threaded_worker(send_event_edsm)
+        def sent_event_edsm(future):
+            # runs on the sending thread once the event is sent or failed
+            if future.cancelled():
+                return
+            try:
+                response = future.result()
+            except Exception as x:
+                response = x
+            if response is not None:
+                syslog.error(f"Failed to send event: {response}")
+
+        # events go out in order, a slow EDSM holds up reading rather than filling memory
+        send_queue = create_worker_pool(send_event_edsm, maxsize=1000, name='edsm_send')
         send_queue.start()
 
         # ----------------------------------------------------------
-        for event in edc_read_journal(logfile, notail=(backlog > 0)):
-            send_queue.put(event.copy())
-            # send_failed = send_queue.get()
-            # if send_failed is not None:
-            #     syslog.error(f"Failed to send event {send_failed}")
-            #     break
-            send_errors = 0
-            while send_queue.get_return() is not None:
-                send_errors += 1
-                if send_errors > 1:
-                    syslog.error(f"Failed to send events")
-                    break
+        for event in enricher.locked(journal_events):
+            if checkpoint:
+                # state covers everything up to the previous event
+                if processed:
+                    checkpoint(processed)
+                processed = dict(cursor)
+
+            if event.get('event') not in edsm_discard:
+                send_queue.submit(event.copy()).add_done_callback(sent_event_edsm)
 
             eventname = event.pop("event")
 
             # Finding guardian things to monitor --------------------
-            if 'guardian' in str(event).lower():
-                if eventname not in [
-                    'Materials', 'Loadout', 'StoredModules',
-                    'ModuleStore', 'ModuleRetrieve', 'ModuleBuy',
-                    'ModuleSellRemote', 'MaterialCollected',
-                    'CollectCargo', 'EjectCargo', 'Music', 'Cargo',
-                    'Touchdown', 'Liftoff', 'ApproachSettlement',
-                    'CodexEntry', 'Location', 'ModuleSell', 'Repair',
-                    'TechnologyBroker', 'FetchRemoteModule', 'MaterialDiscovered',
-                    'FetchRemoteModule', 'AfmuRepairs', 'JetConeDamage',
-                    ''
-
-                ] and not event.get('IsStation') and not 'Guardians of' in str(event):
-                    if eventname not in eventdump:
-                        eventdump[eventname]=[]
-                    eventdump[eventname].append(event.copy())
+            if is_guardian_event(eventname, event):
+                if eventname not in eventdump:
+                    eventdump[eventname]=[]
+                eventdump[eventname].append(event.copy())
+                document_writer.touch('eventdump.json')
 
             timestamp = make_datetime(event.pop("timestamp"))
 
             # general / state =============================================================
-            if not jumptimes:
+            if telemetry.last_entry() is None:
                 entrytime=timestamp.timestamp()
-                jumptimes.append(timestamp.timestamp())
+                telemetry.entry(entrytime)
 
             # Current location ------------------------------------------------------------
-            if eventname == 'Location' or eventname == 'FSDJump':
-                # set current star system
-                system_name = event.get('StarSystem')
-                if system_name in navi_route:
-                    navi_route.pop(system_name)
-
-                sector_name = system_name.split(' ')[0]
-                sector_filename = os.path.join(os.getcwd(), 'data', 'sectors', sector_name + '.json')
-
-                if current_sector != sector_filename:
-                    if sector:
-                        with open(current_sector, 'wt') as jsonfile:
-                            json.dump(sector, jsonfile, indent=3)
-
-                    current_sector = sector_filename
-
-                    if os.path.exists(sector_filename):
-                        with open(sector_filename, 'rt') as jsonfile:
-                            sector = json.load(jsonfile)
-                    else:
-                        sector = {}
-
-                    sectors[sector_name] = sector
-
-
-                if system_name not in sector:
-                    body_id = str(event.get('BodyID',0))
-                    sector[system_name] = dict(
-                        StarPos=event.get('StarPos',[]),
-                        bodies={body_id:dict(Body=event.get('Body'), BodyType=event.get('BodyType'))},
-                        created=timestamp.isoformat()
-                        #stars={event.get('BodyID',0):{}} if bool(event.get('BodyType','') == 'Star') else {}
-                    )
-                    sector[system_name]['stars'] = {i:b for i,b in sector[system_name]['bodies'].items() if b.get('BodyType','') == 'Star'}
-
-                system = sector[system_name]
-
-                guardian_system = bool(event.get('SystemAllegiance', "").lower() == 'guardian')
-                if guardian_system:
-                    guardian_systems.update({
-                        system_name: system.get('StarPos',[])
-                    })
+            state_handlers.dispatch(eventname, event, timestamp)
 
             # update state: system coordinates -----------------------------------------------
             starpos = np.asarray(event.get('StarPos', starpos))
-            header = f"\r{str(timestamp)[:-6]:20} {timestamp.timestamp()-jumptimes[-1]:7,.0F} | {eventname:21} | {system_name:28} {'>' if guardian_system else '|'} "
-            sys.stdout.write(header)
-
-            #
-            # A big CASE ===========================================================
-            if eventname == 'KeyboardInterrupt':
-                sys.stdout.write(f"Keyboard Interrupt {event.get('filename')}\n")
-                kb_stop = True
-                break
-
-            elif eventname == 'JournalFinished':
-                sys.stdout.write(f"Journal read {event.get('filename')}\n")
-                break
+            header = f"\r{str(timestamp)[:-6]:20} {timestamp.timestamp()-telemetry.last_entry():7,.0F} | {eventname:21} | {system_name:28} {'>' if guardian_system else '|'} "
+            write(header)
 
-            elif eventname == 'Fileheader':
-                sys.stdout.write(f"{'Odyssey' if event.get('Odyssey', False) else 'Horizons' }\n{header}")
-                edsm_params['software_info'].update(dict(
-                    fromGameVersion=event.get("gameversion"),
-                    fromGameBuild=event.get("build"),
-                ))
 
             if 'Signals' in event:
                 _signals = event.get('Signals', [])
@@ -459,317 +925,25 @@ def follow_journal(backlog=0, verbose=False):
                     if eventname not in system:
                         system[eventname] = dict()
                     system[eventname][_bodyname] = _signals
+                    system_store.upsert_signals(system_name, eventname, _bodyname, _signals)
 
                 _counts = dict()
                 for n,b in  system[eventname].items():
                     for s in b:
                         _counts[s.get('Type')] = _counts.get(s.get('Type'),0) + s.get('Count', 0)
                 system[f"{eventname}_counts"] = _counts
+                system_store.upsert_discovery(system_name, f"{eventname}_counts", _counts)
 
-                sys.stdout.write(f"Signals: {sum([c for c in _counts.values()])}")
-
-            if eventname == 'FSDJump':
-                entrytime=timestamp.timestamp()
-                body_id = str(event.get('BodyID'))
-                system["BodyID"] = body_id
-                #system['stars'] = list(set(system.get('stars',[])).add(body_id))
-                d1 = distance_1(event.get('StarPos'))
-                if d1 < 2000:
-                    sys.stdout.write(f"Distance to Line 1: {d1:8}")
-
-
-                if system_name in navi_route:
-                    navi_system = navi_route.pop(system_name)
-                else:
-                    navi_system = {}
+                write(f"Signals: {sum([c for c in _counts.values()])}")
 
-                jumptimes.append(entrytime)
-                fuel_used.append(event.get('FuelUsed'))
-                fuel_level.append(event.get('FuelLevel'))
-
-                # handle mission updates
-                if mission_advice and not [True for item in navroute.edc_navigationroute(edlogspath) if item.get('StarSystem') == mission_advice]:
-                    mnames = ', '.join(set([m.get('LocalisedName', '') for i,m in missions.items() if mission_advice==m.get('DestinationSystem') ]))
-                    sys.stdout.write(f"Travel to {mission_advice} for \"{mnames}\"\n{header}")
-
-                # "SystemAllegiance":"Guardian"
-
-                guardian_system = bool(event.get('SystemAllegiance', "") == 'Guardian')
-                if guardian_system:
-                    sys.stdout.write(f"Guardian System\n{header}")
-                    playsound('./sound88.wav')
-
-                system_factions = [f.get('Name','') for f in sorted(event.get('Factions',[{}]),key=lambda X: -X.get('Influence',0))]
-                if len(system_factions) > 1:
-                    sys.stdout.write(f"Faction: {system_factions[0]:32}")
-
-                # Points of interest
-                if system_name in edastro_poi:
-                    sys.stdout.write(f"Poi: {edastro_poi[system_name].get('name')}\n{edastro_poi[system_name].get('type'):20} | {edastro_poi[system_name].get('summary')}\n{header}")
-                else:
-                    sys.stdout.write(f"\n{header}")
-
-                continue
-
-            elif "NavRoute" in eventname:
-                navi_route = {item.get('StarSystem'):item for item in navroute.edc_navigationroute(edlogspath)}
-                if system_name in navi_route:
-                    navi_system = navi_route.pop(system_name)
-                else:
-                    navi_system = {}
-
-                #navi_distances = {s:np.sqrt(np.sum(np.square(np.asarray(i.get('StarPos'))-starpos))) for s, i in navi_route.items()}
-
-                navi_distances_l1 =  {s:distance_1(i.get('StarPos')) for s, i in navi_route.items()}
-
-                if len(navi_distances_l1) > 0:
-                    min_d1, max_d1 = min(navi_distances_l1.values()), max(navi_distances_l1.values())
-                    if min_d1 < 2000:
-                        if len(navi_distances_l1) > 5:
-                            sys.stdout.write(f"Distances to L1 between {min_d1} and {max_d1} \n{header}")
-                        elif min_d1 > 30:
-                            min_d1_entry = list(filter(lambda k: not navi_distances_l1[k] > min_d1, navi_distances_l1.keys()))[0]
-                            nearest_point = nearest_point_on_1(navi_route.get(min_d1_entry,{}).get('StarPos'))
-                            tsg1 = get_systems_in_cube(list(nearest_point), size=100)
-                            if tsg1:
-                                sys.stdout.write(f"Try aiming at {tsg1[0].get('name')} \n{header}")
-                            else:
-                                sys.stdout.write(f"Try aiming at {np.round(nearest_point,1)} \n{header}")
-
-                        else:
-                            sys.stdout.write(f"Distances to L1: {' / '.join([str(v) for v in navi_distances_l1.values()])} \n{header}")
-
-            elif eventname == 'LoadGame':
-                entrytime=timestamp.timestamp()
-                jumptimes.append(entrytime)
-                fuel_level.append(event.get('FuelLevel'))
-                fuel_capacity = max(event.get('FuelCapacity',1),1)
-                #sys.stdout.write(f"\n")
-
-            elif eventname == 'StartJump' and event.get("JumpType") == "Hyperspace":
-                prefetch_queue.put(str(event.get('StarSystem','')))
-                if system_name in navi_route:
-                    navi_route.pop(system_name)
-                sys.stdout.write(f"{event.get('StarSystem',''):25} | class {event.get('StarClass','')}\n{header}") # FuelCapacity
-
-            elif eventname == 'FSDTarget':
-                prefetch_queue.put(str(event.get('Name','')))
-                sys.stdout.write(
-                    f"{event.get('Name',''):25} | class {event.get('StarClass','')}"
-                )
-                if(get_sector_info(event.get('Name',''))):
-                    sys.stdout.write(f" (been there)")
-
-                risk = get_edsm_system_risk(event.get('Name',''))
-                if risk > 1:
-                    sys.stdout.write(f"-> High Risk {round(risk,2)}")
-
-                # Fuel management assistance
-                navi_fuel = {s:np.sqrt(np.sum(np.square(np.asarray(i.get('StarPos'))-starpos))) for s, i in navi_route.items() if i.get('StarClass') in 'KGBFOAM'}
-                if navi_fuel:
-                    fuel_system = reduce(
-                        lambda total, item:item if navi_fuel[item] < navi_fuel[total] else total,
-                        list(navi_fuel)
-                    )
-                    fuel_level = [l for l in fuel_level if l is not None]
-                    fuel_ratio = round(100*fuel_level[-1] / fuel_capacity,1)
-                    est_jumps = round(fuel_level[-1] / (.1+(statistics.mean(fuel_used) if fuel_used else 3)),1)
-                    sys.stdout.write(f", fuel {fuel_ratio}% -> {est_jumps} jumps, fuel at {round(navi_fuel[fuel_system],1)} ly\n{header}")
-                    if est_jumps < 3:
-                        playsound('./sound88.wav')
-                else:
-                     sys.stdout.write(f", {event.get('RemainingJumpsInRoute','')} jumps remaining\n{header}")
-
-
-            elif eventname == 'FuelScoop':
-                fuel_level.append(event.get('Total'))
-                fuel_ratio = round(100*event.get('Total') / fuel_capacity,1)
-                est_jumps = round(fuel_level[-1] / (.1+statistics.mean(fuel_used)),1)
-                sys.stdout.write(f"{fuel_ratio:3}% -> {est_jumps} jumps \n{header}") # FuelCapacity
-
-            elif eventname == 'FSSDiscoveryScan':
-                if eventname not in system:
-                    system[eventname] = {}
-                system[eventname].update({k:event.get(k) for k in ['BodyCount','NonBodyCount','Progress']})
-
-                sys.stdout.write(f"Discovery {', '.join([str(k) + ': ' + str(v) for k,v in system[eventname].items() ])} \n{header}")
-
-            elif eventname == 'Scan':
-                scan_body_id = str(event.get('BodyID'))
-                if scan_body_id not in system["bodies"]:
-                    system["bodies"].update({scan_body_id:event})
-                else:
-                    system["bodies"][scan_body_id].update(event)
-
-                if scan_body_id == body_id:
-                    sys.stdout.write(f"Class {event.get('StarType')}{event.get('Subclass')} ")
-                    if not event.get('WasDiscovered', True):
-                        sys.stdout.write(f" \t{'Undiscovered'} \n{header}")
-                        playsound('./sound88.wav')
-
-                elif event.get('StarType'):
-                    if scan_body_id not in system["stars"]:
-                        system["stars"].update({scan_body_id:system["bodies"][scan_body_id]})
-                    if event.get('StarType') not in 'KGBFOAM' and not event.get("WasDiscovered", True):
-                        sys.stdout.write(f"{event.get('BodyName')}, class {event.get('StarType')}-{event.get('Subclass')}, solar-mass: {round(event.get('StellarMass'),1)} \n{header}")
-                    elif len(system['stars'])>1:
-                        sys.stdout.write(f"Stars: {'/'.join([system['bodies'].get(i,{}).get('StarType','')  for i in system['stars']])}\n{header}")
-
-                elif not event.get("WasDiscovered", True):
-                    if event.get('TerraformState') == 'Terraformable' or planet_values.get(
-                        event.get("WasDiscovered"),{}).get(
-                        event.get("WasMapped"),{}).get(
-                        bool(event.get('TerraformState') == 'Terraformable'),{}).get(
-                        event.get("PlanetClass"),0) > 0:
-
-                        saas = saascan.get(system_name,{}).get(event.get('BodyName'),{})
-                        sys.stdout.write(f"{event.get('BodyName').replace(system_name,'').strip()} {event.get('PlanetClass')} {event.get('TerraformState')} ")
-                        if saas:
-                            sys.stdout.write(f"{saas.get('ProbesUsed')}/{saas.get('EfficiencyTarget')} probes ")
-                        else:
-                            playsound('./sound88.wav')
-
-                        sys.stdout.write(f'\n{header}')
-
-            elif 'FSSBodySignals' == eventname:
-                if system_name not in bodysignals:
-                    bodysignals[system_name] = []
-                bodysignals[system_name].append(event)
-
-            # SAASignalsFound
-            elif 'SAASignalsFound' == eventname:
-
-                if 'guardian' in [S.get('Type_Localised').lower() for S in event.get('Signals',[]) if S.get('Type_Localised')]:
-                    guardian_system = True
-                    guardian_systems.update({
-                        system_name: system.get('StarPos',[])
-                    })
-
-                    sys.stdout.write(f"Guardian Signals: {event.get('BodyName')}, count= {[S.get('Count') for S in event.get('Signals',[]) if S.get('Type_Localised')=='Guardian'][0]}\n{header}")
-
-                    playsound('sonar-ping.wav')
-
-
-            elif 'FSSSignalDiscovered' == eventname:
-                signal = event.get("SignalName_Localised", None)
-                if signal:
-                    if signal not in signals:
-                        signals[signal] = dict()
-                    if system_name not in signals[signal]:
-                        signals[signal][system_name] = []
-                    signals.get(signal).get(system_name).append(event)
-
-                    #.add((system_name,system_factions[0] if system_factions else '-'))
-
-            elif 'SAAScanComplete' == eventname:
-                if system_name not in saascan:
-                    saascan[system_name] = {}
-                saascan[system_name][event.get('BodyName')] = event
-
-            elif 'Screenshot' in eventname:
-                sys.stdout.write(f"{event.get('Body')} {event.get('Filename')}\n{header}")
-                continue
-
-            elif 'Interdict' in eventname:
-                sys.stdout.write(f"{event.get('Interdictor', '??'):22}\n{header}")
-                continue
-
-            elif eventname == 'Music': # "event":"Music", "MusicTrack":"Combat_Unknown"
-                sys.stdout.write(f"{event.get('MusicTrack'):22}")
-                if event.get('MusicTrack') == 'Combat_Unknown':
-                    sys.stdout.write(f"Uh-oh\n{header}")
-                    playsound('./sound88.wav')
-                continue
-
-            elif 'Mission' in eventname:
-                if eventname == 'Missions':
-                    active_missions = set([M.get('MissionID', 0) for M in event.get('Active',[])])
-                    for mid in active_missions:
-                        if mid not in missions:
-                            missions[mid] = {}
-
-                    for mid in set(missions):
-                        if mid not in active_missions:
-                            missions.get(mid).update({
-                                eventname: timestamp.isoformat()
-                            })
-                            completed[mid] = missions.pop(mid)
-                    if not missions:
-                        mission_advice = ''
-                else:
-                    if eventname == 'MissionAbandoned' or  eventname == 'MissionCompleted' :
-                        completed[event.get('MissionID')] = missions.pop(event.get('MissionID'))
-                        if not missions:
-                            mission_advice = ''
-
-                    elif eventname == 'MissionAccepted':
-                        missions[event['MissionID']]={
-                            k:event.get(k, '').split('$')[0] for k in ['LocalisedName', 'Expiry', 'DestinationSystem', 'DestinationStation']
-                        }
-                        sys.stdout.write(f"({len(missions)}) {missions[event['MissionID']].get('LocalisedName')} -> {missions[event['MissionID']].get('DestinationSystem')}\n{header}")
-
-                    elif eventname == 'MissionRedirected':
-                        missions[event['MissionID']].update({
-                            k:event.get('New'+k) for k in ['DestinationSystem', 'DestinationStation']
-                        })
-                        sys.stdout.write(f"({len(missions)}) {missions[event['MissionID']].get('LocalisedName')} -> {missions[event['MissionID']].get('DestinationSystem')}\n{header}")
-
-                    missions.get(event['MissionID'], {}).update({
-                        eventname: timestamp.isoformat(),
-                        'coords': get_edsm_info(missions.get(event['MissionID'], {}).get('DestinationSystem'), verbose=False).get('coords',[])
-                    })
-
-                ordered_routes = get_mission_routes(system_name, missions, jumpdistance=jumpdistance)
-                if ordered_routes:
-                    best_route = ordered_routes[0]
-                    if best_route:
-                        s1, s2 = best_route[0]
-                        mission_advice = s2
-                        mnames = ', '.join(set([m.get('LocalisedName', '') for i,m in missions.items() if s2==m.get('DestinationSystem') ]))
-                        sys.stdout.write(f"Travel to {s2} ({1+math.floor(distance_between_systems(s1, s2)/jumpdistance)}) for \"{mnames: <12}\"\n{header}")
-                        continue
-                else:
-                    mission_advice = ''
-                #sys.stdout.write(f"({len(missions)}) {missions.get(event['MissionID']).get('LocalisedName')} -> {missions.get(event['MissionID']).get('DestinationSystem')}\n")
-
-            elif eventname == 'StoredModules' :
-                #sys.stdout.write(f"{event.get('StationName',''):22}\n")
-                modules = event.get('Items',[{}]).copy()
-                with open('modules.json', "wt") as jsonfile:
-                    json.dump(modules, jsonfile, indent=3)
-
-                continue
-
-            elif ('Loadout' == eventname ):
-                ships[event.get('ShipID')] = event.copy()
-                current_ship = ships[event.get('ShipID')]
-                jumpdistance = round(event.get('MaxJumpRange', 10),1)
-                sys.stdout.write(f"{event.get('Ship',''):15} {event.get('ShipIdent',''):6} {event.get('MaxJumpRange',''):5,.1F} ly\n{header}")
-                fuel_level.append(event.get('FuelLevel'))
-                fuel_capacity = max(event.get('FuelCapacity',{}).get('Main',1),1)
-                all_ships = {}
-                try:
-                    with open('ships.json', "rt") as jsonfile:
-                        all_ships = json.load(jsonfile)
-                    all_ships.update(ships)
-                except Exception as x:
-                    pass
-                finally:
-                    with open('ships.json', "wt") as jsonfile:
-                        json.dump(all_ships, jsonfile, indent=3)
-
-                continue
-
-            elif (eventname == 'Rank' or eventname == 'Progress'):
-                rankings[eventname].update(event)
-                continue
-
-            elif eventname == "Materials":
-                my_materials = {T:{I.get("Name"):I.get("Count") for I in event.get(T,[])} for T in ['Raw','Encoded','Manufactured']}
-                #my_materials = {I.get("Name_Localised", I.get("Name")):I.get("Count") for I in item.get('Raw',[]) + item.get("Encoded",[])}
+            # A big CASE ===========================================================
+            handled = event_handlers.dispatch(eventname, event, timestamp, header)
+            if handled == STOP:
+                break
+            elif handled == DONE:
                 continue
 
-            if ('scan' in eventname.lower() or 'signal' in eventname.lower())  and 'guardian' in str(event).lower() and not event.get('IsStation'):
+            if is_guardian_signal(eventname, event):
                 if eventname not in signaldump:
                     signaldump[eventname]={}
                 if system_name not in signaldump:
@@ -778,25 +952,37 @@ def follow_journal(backlog=0, verbose=False):
                     signaldump[eventname][system_name][event.get('BodyName', '-')] =[]
 
                 signaldump[eventname][system_name][event.get('BodyName', '-')].append(event.copy())
+                document_writer.touch('signaldump.json')
 
-                sys.stdout.write(f"Signal at {event.get('BodyName', event.get('SignalName', '??'))} {', '.join([s.get('Type_Localised') for s in event.get('Signals',[])])} \n{header}") # FuelCapacity
+                write(f"Signal at {event.get('BodyName', event.get('SignalName', '??'))} {', '.join([s.get('Type_Localised') for s in event.get('Signals',[])])} \n{header}") # FuelCapacity
 
         send_queue.stop()
-        sys.stdout.write(f"\nJoining send queue ...\n")
+        write(f"\nJoining send queue ...\n")
         send_queue.join()
 
-        sys.stdout.write(f"\nDone with {logfile} ... Bye bye\n\n")
+        write(f"\nDone with {logfile} ... Bye bye\n\n")
+        syslog.info(f"{state_handlers.report()}\n{event_handlers.report()}\n{metrics_report()}")
 
+    if journal_watcher:
+        journal_watcher.close()
+
+    if checkpoint and cursor:
+        checkpoint(dict(cursor), force=True)
+
+    enricher.close()
+    if deadline is not None:
+        syslog.info(f"EDSM lookups {enricher.stats()}")
+
+    prefetch_queue.stop()
     sound_queue.stop()
-    sys.stdout.write(f"\nJoining sound queue ...\n")
+    write(f"\nJoining sound queue ...\n")
     sound_queue.join()
+    prefetch_queue.join()
 
-    if sector and current_sector:
-        try:
-            with open(current_sector, 'wt') as jsonfile:
-                json.dump(sector, jsonfile, indent=3)
-        except Exception as x:
-            syslog.exception('Error %s', str(x))
+    try:
+        system_store.close()
+    except Exception as x:
+        syslog.exception('Error %s', str(x))
 
     # if systems:
     #     try:
@@ -806,64 +992,18 @@ def follow_journal(backlog=0, verbose=False):
     #         syslog.exception('Error %s', str(x))
     #         sys.stdout.write(f"Error {x}\n")
 
-    if missions:
-        try:
-            with open('missions.json', "wt") as jsonfile:
-                json.dump(missions, jsonfile, indent=3)
-        except Exception as x:
-            syslog.exception('Error %s', str(x))
-
-    if completed:
-        try:
-            with open('completed.json', "wt") as jsonfile:
-                json.dump(completed, jsonfile, indent=3)
-        except Exception as x:
-            syslog.exception('Error %s', str(x))
-
-    if bodysignals:
-        try:
-            with open('bodysignals.json', "wt") as jsonfile:
-                json.dump(bodysignals, jsonfile, indent=3)
-        except Exception as x:
-            sys.stdout.write(f"Error {x}\n")
-
-    if signals:
-        try:
-            with open('signals.json', "wt") as jsonfile:
-                json.dump(signals, jsonfile, indent=3)
-        except Exception as x:
-            sys.stdout.write(f"Error {x}\n")
-
-    if saascan:
-        try:
-            with open('saascan.json', "wt") as jsonfile:
-                json.dump(saascan, jsonfile, indent=3)
-        except Exception as x:
-            sys.stdout.write(f"Error {x}\n")
-
-    if eventdump:
-        try:
-            with open('eventdump.json', "wt") as jsonfile:
-                json.dump(eventdump, jsonfile, indent=3)
-        except Exception as x:
-            sys.stdout.write(f"Error {x}\n")
-
-    if signaldump:
-        try:
-            with open('signaldump.json', "wt") as jsonfile:
-                json.dump(signaldump, jsonfile, indent=3)
-        except Exception as x:
-            sys.stdout.write(f"Error {x}\n")
-
-    if guardian_systems:
-        try:
-            with open('guardian_systems.json', "wt") as jsonfile:
-                json.dump(guardian_systems, jsonfile, indent=3)
-        except Exception as x:
-            sys.stdout.write(f"Error {x}\n")
-
-
-    return sector, system_name
+    document_writer.stop()
+    document_writer.join()
+
+    if own_display:
+        display.stop()
+        display.join()
+
+    metrics_logger.stop()
+    if metrics_server:
+        metrics_server.stop()
+
+    return {system_name: system}, system_name
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,41 @@
+#pylint: disable=missing-module-docstring
+#pylint: disable=missing-function-docstring
+#pylint: disable=invalid-name
+
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from edcompanion.checkpoint import create_checkpointer, load_checkpoint
+from edcompanion.persistence import create_document_writer
+
+def complete_mission(missions, completed, event):
+    # the way follow_journal handles MissionCompleted
+    completed[event['MissionID']] = missions.pop(event['MissionID'])
+
+def test_resume_replays_events_after_the_checkpoint(tmp_path):
+    filename = str(tmp_path / 'follow_checkpoint.json')
+    lock = threading.RLock()
+    writer = create_document_writer(delay=0.5, lock=lock)
+    writer.start()
+
+    missions = {'1': dict(LocalisedName='Courier')}
+    completed = {}
+    checkpoint = create_checkpointer(lambda: dict(missions=missions, completed=completed), filename, writer=writer)
+    events = [dict(event='MissionCompleted', MissionID='1')]
+
+    with lock:
+        checkpoint(dict(journal='Journal.01.log', offset=100), force=True)
+        # one more event before the writer gets to the checkpoint
+        complete_mission(missions, completed, events[0])
+    writer.stop()
+    writer.join()
+
+    # restarting replays the events after the saved offset onto the saved state
+    cursor, state = load_checkpoint(filename)
+    assert cursor == dict(journal='Journal.01.log', offset=100)
+    assert state == dict(missions={'1': dict(LocalisedName='Courier')}, completed={})
+    complete_mission(state['missions'], state['completed'], events[0])
+    assert state == dict(missions={}, completed={'1': dict(LocalisedName='Courier')})
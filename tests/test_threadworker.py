@@ -0,0 +1,57 @@
+#pylint: disable=missing-module-docstring
+#pylint: disable=missing-function-docstring
+#pylint: disable=invalid-name
+
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from edcompanion.metrics import metrics_snapshot
+from edcompanion.threadworker import create_worker_pool, create_producer_from_iterable, COALESCE, DROP
+
+def _put_while_snapshotting(pool, puts=20000, timeout=30):
+    stopping = threading.Event()
+
+    def snapshots():
+        while not stopping.is_set():
+            metrics_snapshot()
+
+    def puts_all():
+        for n in range(puts):
+            pool.put(n % 10)
+
+    threads = [threading.Thread(target=snapshots, daemon=True), threading.Thread(target=puts_all, daemon=True)]
+    for thread in threads:
+        thread.start()
+    threads[1].join(timeout)
+    stopping.set()
+    threads[0].join(timeout)
+    return not any(thread.is_alive() for thread in threads)
+
+def test_snapshot_while_putting_does_not_deadlock():
+    # the pool is not started, so the queue stays full and puts are dropped
+    pool = create_worker_pool(lambda n: n, maxsize=4, policy=DROP, name='test-drop')
+    assert _put_while_snapshotting(pool)
+    assert metrics_snapshot()['test-drop']['counts']['dropped'] > 0
+
+def test_snapshot_while_coalescing_does_not_deadlock():
+    pool = create_worker_pool(lambda n: n, maxsize=4, policy=COALESCE, name='test-coalesce')
+    assert _put_while_snapshotting(pool)
+    counts = metrics_snapshot()['test-coalesce']['counts']
+    # every put is either queued or coalesced, queued tasks beyond maxsize are dropped
+    assert counts['queued'] + counts['coalesced'] == 20000
+    assert counts['queued'] - counts['dropped'] == 4
+
+def test_producer_hands_over_items_read_before_an_exception():
+    def failing():
+        yield from range(300)
+        raise ValueError('journal ended badly')
+
+    producer = create_producer_from_iterable(failing(), prefetch=1024, batchsize=128)
+    producer.start()
+    items = [item for batch in producer.batches(timeout=5) for item in batch]
+    producer.join()
+    assert items == list(range(300))
+    assert isinstance(producer.error(), ValueError)